@@ -0,0 +1,42 @@
+"""unique index on otp.user_id
+
+Revision ID: 3b7e2c9a41f0
+Revises: d5fc1a805e4f
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e2c9a41f0'
+down_revision = 'd5fc1a805e4f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Concurrent OTP requests could create several rows per user, keep the
+    # one with the highest counter so issued codes stay verifiable.
+    op.execute(
+        sa.text(
+            """
+            DELETE FROM otp WHERE id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id
+                        ORDER BY counter DESC, date_created DESC
+                    ) AS position
+                    FROM otp
+                ) AS ranked
+                WHERE position = 1
+            )
+            """
+        )
+    )
+    op.create_index(op.f('ix_otp_user_id'), 'otp', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_otp_user_id'), table_name='otp')
@@ -0,0 +1,24 @@
+"""index on users (date_created, id) for the export
+
+Revision ID: 8c41d0f2a7b3
+Revises: 3b7e2c9a41f0
+Create Date: 2026-10-18 14:03:27.551962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d0f2a7b3'
+down_revision = '3b7e2c9a41f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_date_created_id', 'users', ['date_created', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_date_created_id', table_name='users')
@@ -0,0 +1,37 @@
+"""outbox table for user events
+
+Revision ID: f17a93c5be20
+Revises: 8c41d0f2a7b3
+Create Date: 2026-10-18 15:21:09.304417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f17a93c5be20'
+down_revision = '8c41d0f2a7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('event', sa.String(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbox_available_at'), 'outbox', ['available_at'], unique=False)
+    op.create_index(op.f('ix_outbox_user_id'), 'outbox', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_outbox_user_id'), table_name='outbox')
+    op.drop_index(op.f('ix_outbox_available_at'), table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,17 @@
+import hmac
+
+from fastapi import Header, HTTPException, status
+
+from app.core.config import settings
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Admin routes are disabled unless settings.admin_token is set"""
+    if not (
+        settings.admin_token
+        and x_admin_token
+        and hmac.compare_digest(x_admin_token, settings.admin_token)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
+        )
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.api.admin.auth import require_admin
+from app.api.user.exporter import export_users
+from app.api.user.hashing import password_hasher
+from app.api.user.importer import UserImporter
+from app.core.config import settings
+from app.core.profiling import request_profiler, sign_profile_token
+
+router = APIRouter(
+    tags=["Admin"], prefix="/api/v1/admin", dependencies=[Depends(require_admin)]
+)
+
+
+async def request_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+@router.post("/import")
+async def import_users(
+    request: Request, format: str = "jsonl", batch_size: int = None
+) -> dict:
+    """
+    Bulk imports users from a JSONL or CSV request body, which is streamed
+    rather than buffered. Rows may carry a `hashed_password` instead of a
+    `password`. For resumable imports of large files use
+    `python -m app.api.user.importer` instead.
+    """
+    # shares the hasher's pool rather than spawning one per request
+    importer = UserImporter(batch_size=batch_size, hasher=password_hasher)
+    async with importer:
+        report = await importer.run(request_lines(request), format=format)
+    return report.as_dict()
+
+
+@router.get("/export")
+async def export(since: datetime = None):
+    """
+    Streams users as NDJSON (user_id, name, username, date_created) for
+    re-syncing the social service. Pass the newest `date_created` of the
+    previous export as `since` to only fetch users created after it.
+    """
+    return StreamingResponse(
+        export_users(since=since), media_type="application/x-ndjson"
+    )
+
+
+@router.post("/profiles/token")
+async def profile_token(ttl: int = 300) -> dict:
+    """
+    A signed `X-Profile` header value, valid for `ttl` seconds. Requests
+    sent with it are profiled by whichever worker handles them.
+    """
+    ttl = min(ttl, settings.profiler_token_max_ttl)
+    return {"header": "X-Profile", "value": sign_profile_token(ttl), "ttl": ttl}
+
+
+@router.post("/profiles/arm")
+async def arm_profiler(path: str, count: int = 1) -> dict:
+    """Profiles the next `count` requests to `path` handled by this worker"""
+    request_profiler.arm(path, count)
+    return request_profiler.stats()
+
+
+@router.get("/profiles")
+async def list_profiles() -> dict:
+    return request_profiler.stats()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def download_profile(profile_id: int):
+    """
+    Collapsed stacks (`frame;frame;frame count` per line) of one profiled
+    request, ready for flamegraph.pl or speedscope. The id is sent back in
+    the profiled response's `X-Profile-Id` header.
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.txt"'
+        },
+    )
@@ -1,8 +1,24 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, Response
 from fastapi.responses import RedirectResponse
 
+from app.api.admin.auth import require_admin
 from app.api.system.schema import StatusCheck
+from app.api.user.hashing import password_hasher
+from app.api.user.keys import key_ring
+from app.api.user.outbox import outbox_dispatcher
+from app.api.user.social import social_client
+from app.api.user.token_cache import claim_cache
+from app.api.user.user_cache import user_cache
+from app.api.user.username_index import username_index
+from app.core.config import settings
+from app.core.logger import log_stats
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import CONTENT_TYPE_LATEST, metrics_payload
+from app.core.tracing import trace_sampler
+from app.database.db import database
+from app.email.dispatcher import mail_dispatcher
 from app.email.mail import GmailSender
+from app.utils.pika_rabbit import rabbit_mq
 
 router = APIRouter(tags=["System"])
 
@@ -17,15 +33,109 @@ async def health_status_check() -> StatusCheck:
     return {"status": True, "detail": "API is up and running "}
 
 
+@router.get("/.well-known/jwks.json")
+async def jwks(if_none_match: str = Header(None)):
+    """
+    Public keys for verifying tokens issued by this service. Downstream
+    services cache this and only refetch on an unknown `kid`.
+    """
+    body = key_ring.jwks()
+    headers = {
+        "ETag": key_ring.etag,
+        "Cache-Control": f"public, max-age={settings.jwks_max_age}",
+    }
+    if if_none_match == key_ring.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition of this worker, or of all workers in multiprocess mode"""
+    return Response(metrics_payload(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/status/hashing", dependencies=[Depends(require_admin)])
+async def password_hashing_status():
+    """Active hashing policy, host calibration and pool timings"""
+    return password_hasher.describe()
+
+
+@router.get("/status/tokens", dependencies=[Depends(require_admin)])
+async def token_cache_status():
+    """Hit and miss counters of the verified token claim cache"""
+    return claim_cache.stats()
+
+
+@router.get("/status/database", dependencies=[Depends(require_admin)])
+async def database_pool_status():
+    """Connection pool usage and checkout wait times of this worker"""
+    return database.pool_status()
+
+
+@router.get("/status/usernames", dependencies=[Depends(require_admin)])
+async def username_index_status():
+    """Size, false positive rates and rebuild time of the username index"""
+    return username_index.stats()
+
+
+@router.get("/status/users", dependencies=[Depends(require_admin)])
+async def user_cache_status():
+    """Hit rates of the user lookup cache in this worker"""
+    return user_cache.stats()
+
+
+@router.get("/status/social", dependencies=[Depends(require_admin)])
+async def social_client_status():
+    """Calls, errors, retries and latency per social service endpoint"""
+    return social_client.stats()
+
+
+@router.get("/status/outbox", dependencies=[Depends(require_admin)])
+async def outbox_status():
+    """Deliveries, coalesced events and failures of the outbox dispatcher"""
+    return outbox_dispatcher.stats()
+
+
+@router.get("/status/events", dependencies=[Depends(require_admin)])
+async def event_publisher_status():
+    """Buffer, confirm and drop counters of the RabbitMQ event publisher"""
+    return rabbit_mq.stats()
+
+
+@router.get("/status/mail", dependencies=[Depends(require_admin)])
+async def mail_status():
+    """Queue depth, connections and delivery counters of the mail dispatcher"""
+    return mail_dispatcher.stats()
+
+
+@router.get("/status/tracing", dependencies=[Depends(require_admin)])
+async def tracing_status():
+    """Sentry transactions kept and dropped by the sampler in this worker"""
+    return trace_sampler.stats()
+
+
+@router.get("/status/loop", dependencies=[Depends(require_admin)])
+async def event_loop_status():
+    """Event loop lag percentiles and recent stalls with their stacks"""
+    return loop_monitor.stats()
+
+
+@router.get("/status/logging", dependencies=[Depends(require_admin)])
+async def logging_status():
+    """Queue depth, dropped and sampled-out lines of the log pipeline"""
+    return log_stats()
+
+
 @router.get("/email")
-def send_email():
+async def send_email():
     message = """
 App passwords help you sign in to your Google Account on older apps and services that don’t support modern security standards.
 
 App passwords are less secure than using up-to-date apps and services that use modern security standards. Before you create an app password, you should check to see if your app needs this in order to sign in.
 
         """
-    GmailSender.send_mail(
+    await GmailSender.send_mail(
         subject="Something about Google App Passwords",
         message=message,
         recipient_list=[
@@ -1,24 +1,19 @@
 import time
 from datetime import datetime, timedelta
 
-import httpx
-from jose import jwt
 from jose.exceptions import JWTError
 from fastapi import HTTPException, status
-from google.auth import jwt as g_jwt
-from passlib.context import CryptContext
 from sqlalchemy import select
-from app.core.config import settings
 
+from app.api.user.google_certs import google_certs
+from app.api.user.hashing import password_hasher, pwd_crypt, rehash_if_needed
+from app.api.user.keys import key_ring
+from app.api.user.token_cache import claim_cache
 from app.database.db import AnSession
 from app.database.models.user import User
 
-pwd_crypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 config_credentials = {
-    "SECRET_KEY": settings.secret_key,
-    "ALGORITHM": "HS256",
     "ACCESS_TOKEN_EXPIRE_MINUTES": 30,
-    "REFRESH_SECRET_KEY": settings.secret_key,
     "REFRESH_TOKEN_EXPIRE_MINUTES": 43200,  # 30 days
 }
 
@@ -35,12 +30,15 @@ def get_hashed_password(password):
 
 
 async def verify_password(plain_password, hashed_password):
-    return pwd_crypt.verify(plain_password, hashed_password)
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
 async def authenticate_user(email, password, session: AnSession):
-    user = await session.execute(select(User).where(email=email)).one()
+    user = (
+        await session.execute(select(User).where(User.email == email))
+    ).scalar_one_or_none()
     if user and await verify_password(password, user.password):
+        rehash_if_needed(user.id, user.password, password)
         return user
     return False
 
@@ -53,11 +51,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     to_encode.update({"sub": str(data["user_id"])})
-    encoded_jwt = jwt.encode(
-        to_encode,
-        config_credentials["SECRET_KEY"],
-        algorithm=config_credentials["ALGORITHM"],
-    )
+    encoded_jwt = key_ring.sign(to_encode)
     return encoded_jwt
 
 
@@ -69,11 +63,7 @@ def create_refresh_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + timedelta(minutes=43200)
     to_encode.update({"exp": expire})
     to_encode.update({"sub": str(data["user_id"])})
-    encoded_jwt = jwt.encode(
-        to_encode,
-        config_credentials["REFRESH_SECRET_KEY"],
-        algorithm=config_credentials["ALGORITHM"],
-    )
+    encoded_jwt = key_ring.sign(to_encode)
     return encoded_jwt
 
 
@@ -117,41 +107,46 @@ async def verify_google_jwt(jwt_token):
         "jti": "abc161803398874def"
     }
     """
-    cert_url = "https://www.googleapis.com/oauth2/v1/certs"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(cert_url)
-        google_cert = response.json()
-        result = g_jwt.decode(jwt_token, google_cert)
-        return result
+    result = await google_certs.verify(jwt_token)
+    return result
 
 
 def decodeJWT(token: str, refresh: bool = False) -> dict:
     try:
         if refresh:
-            decoded_token = jwt.decode(
-                token,
-                config_credentials.get("REFRESH_SECRET_KEY"),
-                algorithms=[config_credentials.get("ALGORITHM")],
+            decoded_token = claim_cache.get_or_decode(
+                token, key_ring.verify, refresh=True
             )
             return decoded_token if decoded_token["exp"] >= time.time() else None
         else:
-            decoded_token = jwt.decode(
-                token,
-                config_credentials.get("SECRET_KEY"),
-                algorithms=[config_credentials.get("ALGORITHM")],
-            )
+            decoded_token = claim_cache.get_or_decode(token, key_ring.verify)
             return decoded_token if decoded_token["exp"] >= time.time() else None
     except JWTError:
         return {}
 
 
+def introspect_token(token: str) -> dict:
+    """
+    Reports whether a token issued by this service is currently valid.
+
+    Return:
+    {"active": True, "sub": "<user id>", "exp": 1596477600}
+    """
+    try:
+        decoded_token = claim_cache.get_or_decode(token, key_ring.verify)
+    except JWTError:
+        return {"active": False, "sub": None, "exp": None}
+
+    return {
+        "active": decoded_token["exp"] >= time.time(),
+        "sub": decoded_token.get("sub"),
+        "exp": decoded_token["exp"],
+    }
+
+
 def refreshJWT(token: str):
     try:
-        decoded_token = jwt.decode(
-            token,
-            config_credentials.get("REFRESH_SECRET_KEY"),
-            algorithms=[config_credentials.get("ALGORITHM")],
-        )
+        decoded_token = key_ring.verify(token)
         if decoded_token["exp"] >= time.time():
             # create new access token
             access_token_expires = timedelta(
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import AsyncIterator
+
+import orjson
+from sqlalchemy import select, tuple_
+
+from app.core.config import settings
+from app.database.db import database
+from app.database.models.user import User as UserDb
+
+# The fields create_profile sends to the social service
+EXPORT_COLUMNS = (
+    UserDb.id.label("user_id"),
+    UserDb.name,
+    UserDb.username,
+    UserDb.date_created,
+)
+
+
+async def export_users(
+    since: datetime = None, page_size: int = None, session_factory=None
+) -> AsyncIterator[bytes]:
+    """
+    Yields users as NDJSON, oldest first, one chunk per page.
+
+    Pages are read with keyset pagination on (date_created, id), so each
+    page is a short index range scan in its own transaction and memory
+    stays at one page however large the table is. `since` only exports
+    users created at or after it, for incremental syncs.
+    """
+    page_size = page_size or settings.export_page_size
+    session_factory = session_factory or database.session
+    last = None
+
+    while True:
+        statement = (
+            select(*EXPORT_COLUMNS)
+            .order_by(UserDb.date_created, UserDb.id)
+            .limit(page_size)
+        )
+        if since is not None:
+            statement = statement.where(UserDb.date_created >= since)
+        if last is not None:
+            statement = statement.where(
+                tuple_(UserDb.date_created, UserDb.id) > tuple_(*last)
+            )
+
+        async with session_factory() as session:
+            rows = (await session.execute(statement)).all()
+        if not rows:
+            return
+
+        yield b"".join(
+            orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+        if len(rows) < page_size:
+            return
+        last = (rows[-1].date_created, rows[-1].user_id)
+
+
+async def main(args):
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    exported = 0
+    try:
+        async for chunk in export_users(since=args.since, page_size=args.page_size):
+            await asyncio.to_thread(output.write, chunk)
+            exported += chunk.count(b"\n")
+    finally:
+        if args.output:
+            output.close()
+        await database.disconnect()
+    print(f"exported {exported} users", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export users as NDJSON")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--page-size", type=int)
+    parser.add_argument("--output", help="defaults to stdout")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+import asyncio
+import re
+import time
+
+import httpx
+from google.auth import jwt as g_jwt
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import OUTBOUND_SECONDS
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+# An unknown kid only forces a refetch this long after the last fetch, so
+# tokens with made up kids cannot hammer Google's endpoint.
+MIN_REFRESH_INTERVAL = 30
+
+
+class GoogleCertCache:
+    """
+    Google's OAuth signing certificates, indexed by `kid`.
+
+    Certificates are kept for the `max-age` Google sends with them. Once
+    they go stale they are still served while a single background refresh
+    runs, so a slow certs endpoint never sits on the sign-in path. Only a
+    cold cache or a `kid` we have never seen (Google rotated its keys) makes
+    a caller wait, and concurrent callers share one in-flight fetch.
+    """
+
+    def __init__(self, url: str, transport: httpx.AsyncBaseTransport = None):
+        self.url = url
+        self.transport = transport
+        self.certs: dict = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.fetches = 0
+        self.client: httpx.AsyncClient = None
+        self._refresh: asyncio.Task = None
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=settings.google_certs_timeout,
+            )
+
+    async def stop(self):
+        if self._refresh is not None:
+            self._refresh.cancel()
+            self._refresh = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _fetch(self):
+        await self.start()
+        begin = time.perf_counter()
+        outcome = "ok"
+        try:
+            response = await self.client.get(self.url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            OUTBOUND_SECONDS.labels("google_certs", "certs", outcome).observe(
+                time.perf_counter() - begin
+            )
+        self.fetches += 1
+
+        match = MAX_AGE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else settings.google_certs_default_ttl
+        self.certs = response.json()
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + max_age
+
+    def _refresh_once(self) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._fetch())
+            self._refresh.add_done_callback(self._log_failure)
+        return self._refresh
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Refreshing Google certs failed: {task.exception()}")
+
+    async def get_certs(self, kid: str = None) -> dict:
+        unknown_kid = (
+            kid is not None
+            and kid not in self.certs
+            and time.monotonic() - self.fetched_at >= MIN_REFRESH_INTERVAL
+        )
+        if not self.certs or unknown_kid:
+            await asyncio.shield(self._refresh_once())
+        elif time.monotonic() >= self.expires_at:
+            self._refresh_once()
+        return self.certs
+
+    async def verify(self, jwt_token: str) -> dict:
+        kid = g_jwt.decode_header(jwt_token).get("kid")
+        certs = await self.get_certs(kid)
+        return g_jwt.decode(jwt_token, certs)
+
+
+google_certs = GoogleCertCache(str(settings.google_certs_url))
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from multiprocessing import get_context
+
+import orjson
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from passlib.hash import argon2, bcrypt
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import (
+    PASSWORD_HASH_QUEUE_SECONDS,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_SECONDS,
+)
+
+pwd_crypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+BCRYPT_ROUNDS_RANGE = (10, 16)
+ARGON2_TIME_COST_RANGE = (2, 10)
+CALIBRATION_PASSWORD = "calibration-password"
+
+
+def policy_from_settings() -> dict:
+    """
+    Builds the CryptContext policy from settings. The first scheme hashes new
+    passwords, every other scheme is only kept around to verify old hashes.
+    bcrypt is always kept so existing hashes keep verifying after a switch.
+    """
+    schemes = list(settings.password_hash_schemes)
+    if "argon2" in schemes and not argon2.has_backend():
+        logger.warning("argon2 backend is not installed, falling back to bcrypt")
+        schemes.remove("argon2")
+    if "bcrypt" not in schemes:
+        schemes.append("bcrypt")
+
+    policy = {
+        "schemes": schemes,
+        "deprecated": "auto",
+        "bcrypt__rounds": settings.bcrypt_rounds,
+    }
+    if "argon2" in schemes:
+        policy["argon2__time_cost"] = settings.argon2_time_cost
+        policy["argon2__memory_cost"] = settings.argon2_memory_cost
+    return policy
+
+
+def configure(policy: dict):
+    """Loads a policy into the shared context, also the pool initializer"""
+    pwd_crypt.load(policy)
+
+
+@dataclass(frozen=True)
+class SchemeCalibration:
+    scheme: str
+    params: dict
+    measured_ms: float
+    budget_ms: float
+
+
+def _time_hash(handler, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        handler.hash(CALIBRATION_PASSWORD)
+        best = min(best, time.perf_counter() - begin)
+    return best * 1000
+
+
+def calibrate_bcrypt(budget_ms: float) -> SchemeCalibration:
+    # Each extra bcrypt round doubles the work, so one measurement at the
+    # floor is enough to extrapolate the highest cost that fits the budget.
+    floor, ceiling = BCRYPT_ROUNDS_RANGE
+    base_ms = _time_hash(bcrypt.using(rounds=floor))
+    rounds = floor
+    while rounds < ceiling and base_ms * 2 ** (rounds + 1 - floor) <= budget_ms:
+        rounds += 1
+
+    measured_ms = _time_hash(bcrypt.using(rounds=rounds), repeat=1)
+    return SchemeCalibration("bcrypt", {"rounds": rounds}, measured_ms, budget_ms)
+
+
+def calibrate_argon2(budget_ms: float) -> SchemeCalibration:
+    # argon2 work grows linearly with time_cost at a fixed memory_cost.
+    floor, ceiling = ARGON2_TIME_COST_RANGE
+    memory_cost = settings.argon2_memory_cost
+    base_ms = _time_hash(argon2.using(time_cost=1, memory_cost=memory_cost))
+    time_cost = min(max(int(budget_ms // max(base_ms, 0.001)), floor), ceiling)
+
+    params = {"time_cost": time_cost, "memory_cost": memory_cost}
+    measured_ms = _time_hash(argon2.using(**params), repeat=1)
+    return SchemeCalibration("argon2", params, measured_ms, budget_ms)
+
+
+def calibrate(budget_ms: float, schemes: list) -> dict:
+    """
+    Measures hashing on this host and picks the highest cost per scheme that
+    still fits a single hash into budget_ms.
+
+    Return:
+    {"bcrypt": SchemeCalibration, "argon2": SchemeCalibration}
+    """
+    results = {"bcrypt": calibrate_bcrypt(budget_ms)}
+    if "argon2" in schemes and argon2.has_backend():
+        results["argon2"] = calibrate_argon2(budget_ms)
+    return results
+
+
+def apply_calibration(policy: dict, results: dict) -> dict:
+    policy = dict(policy)
+    for scheme, result in results.items():
+        for key, value in result.params.items():
+            policy[f"{scheme}__{key}"] = value
+    return policy
+
+
+def _hash(password: str):
+    started = time.time()
+    begin = time.perf_counter()
+    result = pwd_crypt.hash(password)
+    return result, started, time.perf_counter() - begin
+
+
+def _verify(plain_password: str, hashed_password: str):
+    started = time.time()
+    begin = time.perf_counter()
+    result = pwd_crypt.verify(plain_password, hashed_password)
+    return result, started, time.perf_counter() - begin
+
+
+def _hash_many(passwords: list):
+    started = time.time()
+    begin = time.perf_counter()
+    result = [pwd_crypt.hash(password) for password in passwords]
+    return result, started, time.perf_counter() - begin
+
+
+def _warm_up():
+    return os.getpid()
+
+
+@dataclass(frozen=True)
+class HashTiming:
+    operation: str
+    queue_ms: float
+    hash_ms: float
+
+
+@dataclass
+class HashStats:
+    calls: int = 0
+    rejected: int = 0
+    queue_ms_total: float = 0.0
+    hash_ms_total: float = 0.0
+    last: dict = field(default_factory=dict)
+
+    def record(self, timing: HashTiming):
+        self.calls += 1
+        self.queue_ms_total += timing.queue_ms
+        self.hash_ms_total += timing.hash_ms
+        self.last[timing.operation] = timing
+
+    def as_dict(self):
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "avg_queue_ms": round(self.queue_ms_total / calls, 3),
+            "avg_hash_ms": round(self.hash_ms_total / calls, 3),
+        }
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification in a process pool so a login never
+    blocks the event loop of the worker handling it.
+
+    workers: number of hashing processes, defaults to the CPU count
+    max_pending: submissions allowed in flight before callers get a 503
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None) -> None:
+        self.workers = workers or settings.password_hash_workers or os.cpu_count()
+        self.max_pending = max_pending or (
+            settings.password_hash_max_pending or self.workers * 8
+        )
+        self.pending = 0
+        self.stats = HashStats()
+        self.policy = policy_from_settings()
+        self.calibration: dict = {}
+        self.executor: ProcessPoolExecutor = None
+        configure(self.policy)
+
+    async def calibrate(self, budget_ms: float = None):
+        """Calibrates cost parameters, must run before start()"""
+        budget_ms = budget_ms or settings.password_hash_budget_ms
+        self.calibration = await asyncio.get_running_loop().run_in_executor(
+            None, calibrate, budget_ms, self.policy["schemes"]
+        )
+        self.policy = apply_calibration(self.policy, self.calibration)
+        configure(self.policy)
+        for result in self.calibration.values():
+            logger.info(
+                f"Calibrated {result.scheme} to {result.params} "
+                f"({result.measured_ms:.1f}ms for a {budget_ms}ms budget)"
+            )
+
+    async def start(self):
+        if self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=configure,
+            initargs=(self.policy,),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, _warm_up)
+                for _ in range(self.workers)
+            )
+        )
+        logger.info(f"Password hasher started with {self.workers} workers")
+
+    async def stop(self):
+        if self.executor is None:
+            return
+        executor, self.executor = self.executor, None
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _hash, password)
+
+    async def hash_many(self, passwords: list) -> list:
+        """Hashes several passwords in one pool task, for bulk imports"""
+        return await self._submit("hash_many", _hash_many, passwords)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit("verify", _verify, plain_password, hashed_password)
+
+    def needs_update(self, hashed_password: str) -> bool:
+        return pwd_crypt.needs_update(hashed_password)
+
+    def describe(self) -> dict:
+        return {
+            "policy": self.policy,
+            "calibration": {
+                scheme: asdict(result) for scheme, result in self.calibration.items()
+            },
+            "stats": self.stats.as_dict(),
+        }
+
+    async def _submit(self, operation, func, *args):
+        if self.pending >= self.max_pending:
+            self.stats.rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        submitted = time.time()
+        try:
+            # Without a pool (CLI, tests) fall back to the default thread
+            # executor, bcrypt releases the GIL while hashing.
+            result, started, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+        finally:
+            self.pending -= 1
+
+        timing = HashTiming(
+            operation=operation,
+            queue_ms=max(started - submitted, 0.0) * 1000,
+            hash_ms=elapsed * 1000,
+        )
+        self.stats.record(timing)
+        PASSWORD_HASH_SECONDS.labels(operation).observe(elapsed)
+        PASSWORD_HASH_QUEUE_SECONDS.labels(operation).observe(timing.queue_ms / 1000)
+        logger.debug(
+            f"password {operation}: queue={timing.queue_ms:.1f}ms "
+            f"hash={timing.hash_ms:.1f}ms"
+        )
+        return result
+
+
+password_hasher = PasswordHasher()
+
+_rehash_tasks = set()
+
+
+async def _rehash(user_id, hashed_password: str, password: str):
+    from sqlalchemy import update
+
+    from app.database.db import database
+    from app.database.models.user import User as UserDb
+
+    try:
+        new_hash = await password_hasher.hash(password)
+        async with database.session() as session:
+            # Only replace the hash that was verified, a password change in
+            # the meantime wins.
+            await session.execute(
+                update(UserDb)
+                .where(UserDb.id == user_id, UserDb.password == hashed_password)
+                .values(password=new_hash)
+            )
+            await session.commit()
+    except HTTPException:
+        logger.info(f"Skipped rehash of user {user_id}, hasher is saturated")
+    except Exception as e:
+        logger.exception(f"Rehash of user {user_id} failed: {e}")
+
+
+def rehash_if_needed(user_id, hashed_password: str, password: str):
+    """
+    Rehashes a just verified password in the background when its hash was
+    made with an older scheme or cost, so policy changes roll out on login.
+    """
+    if not password_hasher.needs_update(hashed_password):
+        return
+    task = asyncio.create_task(_rehash(user_id, hashed_password, password))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Calibrate password hashing cost to a latency budget"
+    )
+    parser.add_argument(
+        "--budget-ms", type=float, default=settings.password_hash_budget_ms
+    )
+    args = parser.parse_args()
+
+    results = calibrate(args.budget_ms, password_hasher.policy["schemes"])
+    print(
+        orjson.dumps(
+            {scheme: asdict(result) for scheme, result in results.items()},
+            option=orjson.OPT_INDENT_2,
+        ).decode()
+    )
+    for scheme, result in results.items():
+        for key, value in result.params.items():
+            print(f"{scheme.upper()}_{key.upper()}={value}")
@@ -0,0 +1,409 @@
+import argparse
+import asyncio
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import AsyncIterator
+from uuid import uuid4
+
+import orjson
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import text
+
+from app.api.user.hashing import (
+    PasswordHasher,
+    _hash_many,
+    configure,
+    password_hasher,
+    pwd_crypt,
+)
+from app.api.user.schemas import User
+from app.api.user.services import UserService
+from app.api.user.username_index import username_index
+from app.core.config import settings
+from app.database.db import database, dialect_insert
+from app.database.models.user import User as UserDb
+from app.utils.helper import username_candidates
+
+COLUMNS = ("id", "name", "email", "username", "password", "date_created")
+# Plaintext passwords hashed per pool task. On the password hasher's pool an
+# import keeps at most half its workers busy, so a login queues behind a few
+# chunks at worst
+HASH_CHUNK = 16
+# Wait before resubmitting a chunk the saturated password hasher turned down
+HASHER_BUSY_WAIT = 1.0
+
+
+@dataclass
+class BatchReport:
+    batch: int
+    first_line: int
+    last_line: int
+    imported: int = 0
+    skipped: list = field(default_factory=list)  # [line, reason]
+    errors: list = field(default_factory=list)  # [line, message]
+    seconds: float = 0.0
+
+
+@dataclass
+class ImportReport:
+    resumed_from: int = 0
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    batches: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.imported + self.skipped + self.failed
+        return rows / self.seconds if self.seconds else 0.0
+
+    def add(self, batch: BatchReport):
+        self.batches.append(batch)
+        self.imported += batch.imported
+        self.skipped += len(batch.skipped)
+        self.failed += len(batch.errors)
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+class Checkpoint:
+    """
+    Remembers the last source line whose batch was committed, so a rerun
+    of the same file picks up after it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> int:
+        if not self.path.exists():
+            return 0
+        return orjson.loads(self.path.read_bytes())["line"]
+
+    def save(self, line: int, report: ImportReport):
+        state = {"line": line, "imported": report.imported, "at": time.time()}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(orjson.dumps(state))
+        tmp.replace(self.path)
+
+
+class UserImporter:
+    """
+    Streams users from JSONL or CSV lines into the users table.
+
+    Rows are validated with the `User` schema in batches, plaintext
+    passwords are hashed across a process pool (the password hasher's when
+    one is passed in, a few chunks at a time, else a pool of its own) and
+    rows that carry a `hashed_password` in a format we recognise are taken
+    as is. Postgres batches go through COPY into a temp table followed by one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, other databases get a
+    multi-row INSERT ... ON CONFLICT DO NOTHING. Rows that clash with an
+    existing email or username are reported as skipped.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        workers: int = None,
+        checkpoint: Checkpoint = None,
+        on_batch=None,
+        session_factory=None,
+        hasher: PasswordHasher = None,
+    ) -> None:
+        self.batch_size = batch_size or settings.import_batch_size
+        self.workers = workers or settings.import_workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.on_batch = on_batch
+        self.session_factory = session_factory or database.session
+        self.hasher = hasher
+        self.executor: ProcessPoolExecutor = None
+        if hasher is not None:
+            self._in_flight = asyncio.Semaphore(max(hasher.workers // 2, 1))
+
+    async def __aenter__(self):
+        if self.hasher is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=configure,
+                initargs=(password_hasher.policy,),
+            )
+        return self
+
+    async def __aexit__(self, *args):
+        if self.executor is None:
+            return
+        executor, self.executor = self.executor, None
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )
+
+    async def run(self, lines: AsyncIterator[str], format: str = "jsonl"):
+        report = ImportReport()
+        report.resumed_from = self.checkpoint.load() if self.checkpoint else 0
+        begin = time.perf_counter()
+
+        header, batch, line_no = None, [], 0
+        async for line in lines:
+            line_no += 1
+            line = line.strip()
+            if format == "csv" and header is None:
+                header = next(csv.reader([line]))
+                continue
+            if not line or line_no <= report.resumed_from:
+                continue
+
+            if format == "csv":
+                record = dict(zip(header, next(csv.reader([line]))))
+            else:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError as e:
+                    record = e
+            batch.append((line_no, record))
+
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, report)
+                batch = []
+
+        if batch:
+            await self._flush(batch, report)
+
+        report.seconds = time.perf_counter() - begin
+        return report
+
+    def _validate(self, line_no, record, batch: BatchReport):
+        if isinstance(record, Exception):
+            batch.errors.append([line_no, f"invalid row: {record}"])
+            return None
+
+        # empty CSV cells count as missing
+        hashed_password = record.pop("hashed_password", None) or None
+        if not record.get("username"):
+            record.pop("username", None)
+        if hashed_password is not None:
+            if not pwd_crypt.identify(hashed_password):
+                batch.errors.append([line_no, "unrecognised password hash"])
+                return None
+            record["password"] = hashed_password
+
+        try:
+            user = User(**record)
+        except ValidationError as e:
+            batch.errors.append([line_no, str(e.errors()[0]["msg"])])
+            return None
+
+        return {
+            "id": uuid4(),
+            "name": user.name,
+            "email": user.email,
+            "username": user.username,
+            "password": user.password,
+            "date_created": datetime.utcnow(),
+            "_line": line_no,
+            "_hashed": hashed_password is not None,
+        }
+
+    async def _hash(self, rows: list):
+        plain = [row for row in rows if not row["_hashed"]]
+        if not plain:
+            return
+        chunk = min(-(-len(plain) // self.workers), HASH_CHUNK)
+        chunks = [plain[i : i + chunk] for i in range(0, len(plain), chunk)]
+        hashed = await asyncio.gather(
+            *(self._hash_chunk([row["password"] for row in part]) for part in chunks)
+        )
+        for part, hashes in zip(chunks, hashed):
+            for row, password in zip(part, hashes):
+                row["password"] = password
+
+    async def _hash_chunk(self, passwords: list) -> list:
+        if self.hasher is None:
+            hashes, _, _ = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _hash_many, passwords
+            )
+            return hashes
+        async with self._in_flight:
+            while True:
+                try:
+                    return await self.hasher.hash_many(passwords)
+                except HTTPException:
+                    # logins have the pool saturated, they go first
+                    await asyncio.sleep(HASHER_BUSY_WAIT)
+
+    async def _assign_usernames(self, session, rows: list, batch: BatchReport):
+        """
+        Picks usernames for rows without one, all checked against the users
+        table in one query. The few whose candidates are all taken go
+        through suggest_usernames.
+        """
+        missing = [row for row in rows if row["username"] is None]
+        if not missing:
+            return rows
+        service = UserService(session=session)
+        candidates = [username_candidates(row["name"], 4, 4) for row in missing]
+        free = set(
+            await service.free_usernames(
+                [name for names in candidates for name in names]
+            )
+        )
+        free -= {row["username"] for row in rows}
+
+        for row, names in zip(missing, candidates):
+            username = next((name for name in names if name in free), None)
+            if username is None:
+                suggestions = await service.suggest_usernames(row["name"], 1)
+                username = suggestions[0] if suggestions else None
+            if username is None:
+                batch.errors.append([row["_line"], "no free username found"])
+                continue
+            free.discard(username)
+            row["username"] = username
+        return [row for row in rows if row["username"] is not None]
+
+    async def _write(self, session, rows: list) -> set:
+        records = [{column: row[column] for column in COLUMNS} for row in rows]
+        if session.bind.dialect.name == "postgresql":
+            return await self._copy(session, records)
+
+        statement = (
+            dialect_insert(session)(UserDb)
+            .values(records)
+            .on_conflict_do_nothing()
+            .returning(UserDb.id)
+        )
+        return {str(id) for id in (await session.execute(statement)).scalars()}
+
+    async def _copy(self, session, records: list) -> set:
+        # Through the session, so the transaction is begun before the COPY.
+        # On the bare asyncpg connection the COPY would autocommit and
+        # ON COMMIT DELETE ROWS would empty the table straight away.
+        await session.execute(
+            text(
+                "CREATE TEMP TABLE IF NOT EXISTS users_import "
+                "(LIKE users INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+            )
+        )
+        connection = await session.connection()
+        raw = (await connection.get_raw_connection()).driver_connection
+        await raw.copy_records_to_table(
+            "users_import",
+            records=[tuple(record[column] for column in COLUMNS) for record in records],
+            columns=COLUMNS,
+        )
+        columns = ", ".join(COLUMNS)
+        result = await session.execute(
+            text(
+                f"INSERT INTO users ({columns}) SELECT {columns} FROM users_import "
+                "ON CONFLICT DO NOTHING RETURNING id"
+            )
+        )
+        return {str(id) for id in result.scalars()}
+
+    async def _flush(self, batch: list, report: ImportReport):
+        begin = time.perf_counter()
+        result = BatchReport(
+            batch=len(report.batches) + 1,
+            first_line=batch[0][0],
+            last_line=batch[-1][0],
+        )
+
+        rows = []
+        for line_no, record in batch:
+            row = self._validate(line_no, record, result)
+            if row is not None:
+                rows.append(row)
+
+        if rows:
+            await self._hash(rows)
+            async with self.session_factory() as session:
+                rows = await self._assign_usernames(session, rows, result)
+                inserted = await self._write(session, rows)
+                await session.commit()
+            result.imported = len(inserted)
+            for row in rows:
+                if str(row["id"]) in inserted:
+                    username_index.add(row["username"])
+                else:
+                    result.skipped.append(
+                        [row["_line"], "email or username already exists"]
+                    )
+
+        result.seconds = time.perf_counter() - begin
+        report.add(result)
+        if self.checkpoint:
+            self.checkpoint.save(result.last_line, report)
+        if self.on_batch:
+            self.on_batch(result)
+
+
+async def read_lines(path: Path):
+    # The file is read in a thread so a slow disk doesn't stall the loop.
+    with open(path, "r", encoding="utf-8") as source:
+        while True:
+            lines = await asyncio.to_thread(source.readlines, 1 << 20)
+            if not lines:
+                break
+            for line in lines:
+                yield line
+
+
+async def main(args):
+    path = Path(args.path)
+    format = args.format or ("csv" if path.suffix == ".csv" else "jsonl")
+    checkpoint = Checkpoint(args.checkpoint or f"{path}.checkpoint")
+    if args.restart and checkpoint.path.exists():
+        checkpoint.path.unlink()
+
+    def on_batch(batch: BatchReport):
+        rate = (batch.last_line - batch.first_line + 1) / (batch.seconds or 1)
+        print(
+            f"batch {batch.batch}: lines {batch.first_line}-{batch.last_line} "
+            f"imported={batch.imported} skipped={len(batch.skipped)} "
+            f"errors={len(batch.errors)} {rate:.0f} rows/s"
+        )
+        for line_no, message in batch.errors + batch.skipped:
+            print(f"  line {line_no}: {message}")
+
+    importer = UserImporter(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        checkpoint=checkpoint,
+        on_batch=on_batch,
+    )
+    async with importer:
+        report = await importer.run(read_lines(path), format=format)
+    await database.disconnect()
+
+    print(
+        f"imported={report.imported} skipped={report.skipped} "
+        f"failed={report.failed} in {report.seconds:.1f}s "
+        f"({report.rows_per_second:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import users from a JSONL or CSV file"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["jsonl", "csv"])
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--checkpoint", help="defaults to <path>.checkpoint")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore an existing checkpoint"
+    )
+    asyncio.run(main(parser.parse_args()))
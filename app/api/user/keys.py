@@ -0,0 +1,159 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import orjson
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from jose.exceptions import JWTError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import JWT_SECONDS
+
+ALGORITHM = "RS256"
+LEGACY_ALGORITHM = "HS256"
+
+
+class KeyRing:
+    """
+    RS256 signing and verification keys, tagged by `kid`.
+
+    Keys are read from `settings.jwt_keys_dir`:
+    <kid>.pem: private key, can sign and verify
+    <kid>.pub: public key of a retired signing key, verify only
+
+    New tokens are signed with `settings.jwt_active_kid`, or the most
+    recently modified private key. Every key in the directory stays valid for
+    verification, so rotating is adding a new key, switching the active kid,
+    and deleting the old one once its tokens have expired.
+
+    HS256 tokens from before RS256 are accepted while
+    `jwt_accept_legacy_hs256` is on and until `jwt_legacy_hs256_until`, set
+    it to the switch plus the longest token lifetime. Outside debug there is
+    no fallback without that cutoff.
+    """
+
+    def __init__(self, keys_dir: Path) -> None:
+        self.keys_dir = Path(keys_dir)
+        self.signing_kid: str = None
+        self.signing_key = None
+        self.verification_keys: dict = {}
+        self._jwks: bytes = b""
+        self.etag = ""
+
+    def load(self):
+        private_keys = sorted(
+            self.keys_dir.glob("*.pem"), key=lambda path: path.stat().st_mtime
+        )
+        if not private_keys:
+            if not settings.debug:
+                raise RuntimeError(f"No JWT signing key found in {self.keys_dir}")
+            private_keys = [self._generate_key()]
+
+        signing_keys, verification_keys = {}, {}
+        for path in private_keys:
+            key = jwk.construct(path.read_text(), ALGORITHM)
+            signing_keys[path.stem] = key
+            verification_keys[path.stem] = key.public_key()
+        for path in self.keys_dir.glob("*.pub"):
+            verification_keys[path.stem] = jwk.construct(path.read_text(), ALGORITHM)
+        self.verification_keys = verification_keys
+
+        self.signing_kid = settings.jwt_active_kid or private_keys[-1].stem
+        if (
+            settings.jwt_accept_legacy_hs256
+            and settings.jwt_legacy_hs256_until is None
+            and not settings.debug
+        ):
+            logger.warning(
+                "HS256 tokens are rejected, set JWT_LEGACY_HS256_UNTIL to accept them"
+            )
+        self.signing_key = signing_keys[self.signing_kid]
+
+        jwks = {
+            "keys": [
+                {**key.to_dict(), "kid": kid, "use": "sig"}
+                for kid, key in sorted(self.verification_keys.items())
+            ]
+        }
+        self._jwks = orjson.dumps(jwks)
+        self.etag = f'"{hashlib.sha256(self._jwks).hexdigest()[:32]}"'
+        logger.info(
+            f"Loaded {len(self.verification_keys)} JWT verification keys, "
+            f"signing with {self.signing_kid}"
+        )
+
+    def _generate_key(self) -> Path:
+        logger.warning(f"Generating a development JWT signing key in {self.keys_dir}")
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self.keys_dir.mkdir(parents=True, exist_ok=True)
+        path = self.keys_dir / "dev.pem"
+        # Every worker may get here at once. Each writes its key to a file of
+        # its own and links it into place, which only one can do; the others
+        # use the winner's key, so all workers sign with the same one.
+        fd, tmp = tempfile.mkstemp(prefix="dev.", suffix=".tmp", dir=self.keys_dir)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(pem)
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp)
+        return path
+
+    def _ensure_loaded(self):
+        if self.signing_key is None:
+            self.load()
+
+    def sign(self, claims: dict) -> str:
+        self._ensure_loaded()
+        with JWT_SECONDS.labels("encode").time():
+            return jwt.encode(
+                claims,
+                self.signing_key,
+                algorithm=ALGORITHM,
+                headers={"kid": self.signing_kid},
+            )
+
+    def verify(self, token: str) -> dict:
+        with JWT_SECONDS.labels("decode").time():
+            return self._verify(token)
+
+    def _verify(self, token: str) -> dict:
+        self._ensure_loaded()
+        header = jwt.get_unverified_header(token)
+
+        if header.get("alg") == LEGACY_ALGORITHM and self._legacy_accepted():
+            # Tokens issued before the switch to RS256 stay valid until they
+            # expire.
+            return jwt.decode(token, settings.secret_key, algorithms=[LEGACY_ALGORITHM])
+
+        kid = header.get("kid")
+        key = self.verification_keys.get(kid) if isinstance(kid, str) else None
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+    def _legacy_accepted(self) -> bool:
+        if not settings.jwt_accept_legacy_hs256:
+            return False
+        if settings.jwt_legacy_hs256_until is None:
+            return settings.debug
+        return datetime.utcnow() < settings.jwt_legacy_hs256_until
+
+    def jwks(self) -> bytes:
+        self._ensure_loaded()
+        return self._jwks
+
+
+key_ring = KeyRing(settings.jwt_keys_dir or settings.base_dir / "keys")
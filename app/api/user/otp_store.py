@@ -0,0 +1,136 @@
+import secrets
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from cachetools import TTLCache
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.database.db import dialect_insert
+from app.database.models.user import OTP
+
+# TTL stores forget a counter once it expires, new counters start at a random
+# base so a user never gets a code that was already issued to them.
+COUNTER_SEED_RANGE = 2**31
+
+
+class OTPState(NamedTuple):
+    counter: int
+    issued_at: Optional[datetime]  # None once the last otp has expired
+
+
+class OTPStore(ABC):
+    """
+    Where OTPGenerator keeps a user's HOTP counter. The stored counter is
+    always one ahead of the counter the last otp was generated with.
+    """
+
+    @abstractmethod
+    async def next_counter(self, user_id: UUID) -> int:
+        """Atomically creates or bumps the counter and returns the stored value"""
+
+    @abstractmethod
+    async def get(self, user_id: UUID) -> Optional[OTPState]:
+        """Current counter and issue time, None if no otp was ever issued"""
+
+
+class SQLOTPStore(OTPStore):
+    def __init__(self, session) -> None:
+        self.session = session
+
+    async def next_counter(self, user_id):
+        now = datetime.now()
+        stmt = (
+            dialect_insert(self.session)(OTP)
+            .values(user_id=user_id, counter=2, date_created=now)
+            .on_conflict_do_update(
+                index_elements=[OTP.user_id],
+                set_={"counter": OTP.counter + 1, "date_created": now},
+            )
+            .returning(OTP.counter)
+        )
+        counter = (await self.session.execute(stmt)).scalar_one()
+        await self.session.commit()
+        return counter
+
+    async def get(self, user_id):
+        stmt = select(OTP.counter, OTP.date_created).where(OTP.user_id == user_id)
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return None
+        return OTPState(row.counter, row.date_created)
+
+
+class MemoryOTPStore(OTPStore):
+    """Per-process store for single node deployments and tests"""
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.counters = TTLCache(maxsize=maxsize, ttl=settings.otp_counter_ttl)
+
+    async def next_counter(self, user_id):
+        counter, _ = self.counters.get(
+            user_id, (secrets.randbelow(COUNTER_SEED_RANGE), None)
+        )
+        self.counters[user_id] = (counter + 1, time.time())
+        return counter + 1
+
+    async def get(self, user_id):
+        entry = self.counters.get(user_id)
+        if entry is None:
+            return None
+        counter, issued_at = entry
+        if time.time() - issued_at > settings.otp_ttl:
+            return OTPState(counter, None)
+        return OTPState(counter, datetime.fromtimestamp(issued_at))
+
+
+class RedisOTPStore(OTPStore):
+    """
+    Counter and issue time live in two keys with native expiry: the issue
+    time expires with the otp, the counter lives on for otp_counter_ttl.
+    Issuing is one MULTI/EXEC round trip, verifying is one MGET.
+    """
+
+    def __init__(self, connection=None) -> None:
+        self.connection = connection
+
+    def _keys(self, user_id):
+        return f"otp:{user_id}:counter", f"otp:{user_id}:issued"
+
+    async def next_counter(self, user_id):
+        counter_key, issued_key = self._keys(user_id)
+        async with self.connection.pipeline(transaction=True) as pipe:
+            pipe.set(
+                counter_key,
+                secrets.randbelow(COUNTER_SEED_RANGE),
+                nx=True,
+                ex=settings.otp_counter_ttl,
+            )
+            pipe.incr(counter_key)
+            pipe.expire(counter_key, settings.otp_counter_ttl)
+            pipe.set(issued_key, time.time(), ex=settings.otp_ttl)
+            _, counter, _, _ = await pipe.execute()
+        return int(counter)
+
+    async def get(self, user_id):
+        counter, issued_at = await self.connection.mget(self._keys(user_id))
+        if counter is None:
+            return None
+        if issued_at is None:
+            return OTPState(int(counter), None)
+        return OTPState(int(counter), datetime.fromtimestamp(float(issued_at)))
+
+
+memory_otp_store = MemoryOTPStore()
+redis_otp_store = RedisOTPStore()  # connection is attached in lifespan
+
+
+def get_otp_store(session) -> OTPStore:
+    if settings.otp_backend == "redis":
+        return redis_otp_store
+    if settings.otp_backend == "memory":
+        return memory_otp_store
+    return SQLOTPStore(session)
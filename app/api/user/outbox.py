@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import httpx
+from sqlalchemy import delete, func, insert, select, update
+
+from app.api.user.social import SocialClient, social_client
+from app.core.config import settings
+from app.core.logger import logger
+from app.database.db import database
+from app.database.models.outbox import OutboxEvent
+
+PROFILE_CREATED = "profile.created"
+USERNAME_UPDATED = "username.updated"
+# Postgres advisory lock key ("outbox") that claims take one at a time
+CLAIM_LOCK = 0x6F7574626F78
+
+
+async def add_event(session, user_id, event: str, payload: dict):
+    """Queues an event in the caller's transaction, it is sent once committed"""
+    await session.execute(
+        insert(OutboxEvent).values(
+            user_id=UUID(str(user_id)), event=event, payload=payload
+        )
+    )
+
+
+def coalesce(events: list) -> list:
+    """
+    Groups a user's events into deliveries. A run of username changes
+    only needs its last one sent, each delivery carries the ids it covers.
+    """
+    deliveries = []
+    for event in events:
+        if (
+            deliveries
+            and event.event == USERNAME_UPDATED
+            and deliveries[-1][0].event == USERNAME_UPDATED
+        ):
+            deliveries[-1] = (event, deliveries[-1][1] + [event.id])
+        else:
+            deliveries.append((event, [event.id]))
+    return deliveries
+
+
+class OutboxDispatcher:
+    """
+    Drains the outbox to the social service in the background.
+
+    Each drain claims the oldest available events in a short transaction,
+    leasing them for `outbox_lease` seconds by pushing their `available_at`
+    out. The events are then sent with no transaction or pooled connection
+    held, every user's in id order and users concurrently, and a second
+    short transaction deletes what was delivered. A user with an event in
+    the future, leased or held back, is skipped entirely. For that to keep
+    workers from overtaking each other, a claim has to see the leases of
+    the claims before it: on Postgres claims take a transaction level
+    advisory lock, so they run one at a time (for the length of the claim
+    only, never during delivery). When a send fails all of that user's
+    events are held back with exponential backoff. A worker dying
+    mid-drain just lets its lease run out, delivery is at least once.
+    """
+
+    def __init__(self, client: SocialClient = None, session_factory=None) -> None:
+        self.client = client or social_client
+        self.session_factory = session_factory or database.session
+        self.delivered = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.drains = 0
+        self.last_drain_ms = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self):
+        """Called after a commit that queued events, skips the poll wait"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            drained = 0
+            try:
+                drained = await self.drain()
+            except Exception as e:
+                logger.exception(f"Draining the outbox failed: {e}")
+            if drained < settings.outbox_batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), settings.outbox_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain(self) -> int:
+        begin = time.perf_counter()
+        events = await self._claim()
+        if not events:
+            return 0
+
+        by_user = defaultdict(list)
+        for event in events:
+            by_user[event.user_id].append(event)
+
+        limit = asyncio.Semaphore(settings.outbox_concurrency)
+        results = await asyncio.gather(
+            *(self._send_user(user_events, limit) for user_events in by_user.values())
+        )
+
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            delivered = [id for ids, _ in results for id in ids]
+            if delivered:
+                await session.execute(
+                    delete(OutboxEvent).where(OutboxEvent.id.in_(delivered))
+                )
+            for (_, failed), user_events in zip(results, by_user.values()):
+                if failed:
+                    await self._hold_back(session, user_events[0], now)
+            await session.commit()
+
+        self.drains += 1
+        self.last_drain_ms = (time.perf_counter() - begin) * 1000
+        return len(events)
+
+    async def _claim(self) -> list:
+        """Selects and leases a batch, returns plain rows usable after commit"""
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            if session.bind.dialect.name == "postgresql":
+                await session.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK)))
+            held_back = select(OutboxEvent.user_id).where(
+                OutboxEvent.available_at > now
+            )
+            statement = (
+                select(
+                    OutboxEvent.id,
+                    OutboxEvent.user_id,
+                    OutboxEvent.event,
+                    OutboxEvent.payload,
+                    OutboxEvent.attempts,
+                )
+                .where(
+                    OutboxEvent.available_at <= now,
+                    OutboxEvent.user_id.not_in(held_back),
+                )
+                .order_by(OutboxEvent.id)
+                .limit(settings.outbox_batch_size)
+            )
+            events = (await session.execute(statement)).all()
+            if events:
+                await session.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_([event.id for event in events]))
+                    .values(available_at=now + timedelta(seconds=settings.outbox_lease))
+                )
+                await session.commit()
+        return events
+
+    async def _send_user(self, events: list, limit: asyncio.Semaphore):
+        delivered = []
+        async with limit:
+            for event, ids in coalesce(events):
+                if not await self._deliver(event):
+                    return delivered, True
+                delivered += ids
+                self.delivered += 1
+                self.coalesced += len(ids) - 1
+        return delivered, False
+
+    async def _deliver(self, event) -> bool:
+        try:
+            if event.event == PROFILE_CREATED:
+                response = await self.client.create_profile(event.payload)
+            elif event.event == USERNAME_UPDATED:
+                response = await self.client.update_username(**event.payload)
+            else:
+                logger.error(f"Dropping outbox event of unknown type {event.event}")
+                return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Delivering {event!r} failed: {e!r}")
+            self.failures += 1
+            return False
+
+        if response.status_code >= 500:
+            logger.warning(f"Delivering {event!r} failed: {response.status_code}")
+            self.failures += 1
+            return False
+        if response.status_code >= 400:
+            # a retry would be rejected the same way
+            logger.error(f"Social service rejected {event!r}: {response.text}")
+        return True
+
+    async def _hold_back(self, session, event, now: datetime):
+        delay = min(
+            settings.outbox_backoff_max, settings.outbox_backoff * 2**event.attempts
+        )
+        await session.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.user_id == event.user_id)
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                available_at=now + timedelta(seconds=delay),
+            )
+        )
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "drains": self.drains,
+            "last_drain_ms": round(self.last_drain_ms, 3),
+        }
+
+
+outbox_dispatcher = OutboxDispatcher()
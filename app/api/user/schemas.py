@@ -1,32 +1,26 @@
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 from aredis_om import JsonModel
 from pydantic import (  # , EmailStr#, conint, conlist,
     BaseModel,
     EmailStr,
+    conlist,
     constr,
-    root_validator,
     validator,
 )
 
-from app.utils.helper import create_custom_username
+from app.core.config import settings
 
 
 class User(BaseModel):
-    username: Optional[constr(min_length=3)]
+    # left empty, one is picked with a database check when the user is created
+    username: Optional[constr(min_length=3)] = None
     name: constr(min_length=3)
     email: EmailStr
     password: constr(min_length=8)
     picture: Optional[str] = None
 
-    @root_validator(pre=True)
-    def validate_username(cls, values, **kwargs):
-        if values.get("username") is None:
-            values["username"] = create_custom_username(values.get("name"))
-
-        return values
-
 
 class User2(JsonModel):
     username: constr(min_length=3)
@@ -92,3 +86,17 @@ class MessageProfile(BaseModel):
 
 class UsernameChange(BaseModel):
     new_username: str
+
+
+class TokenIntrospect(BaseModel):
+    tokens: conlist(str, min_length=1, max_length=settings.introspect_max_tokens)
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+
+
+class IntrospectionProfile(BaseModel):
+    results: List[TokenIntrospection]
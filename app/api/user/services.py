@@ -1,31 +1,42 @@
+import math
 from datetime import datetime, timedelta
 from uuid import UUID
 
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import ExpiredSignatureError, JWTError, jwt
-from passlib.context import CryptContext
+from jose import ExpiredSignatureError, JWTError
 from sqlalchemy import select, update
 from sqlalchemy.exc import IntegrityError
 
 from app.api.user.authentication import generate_jwt_pair
+from app.api.user.hashing import password_hasher, rehash_if_needed
+from app.api.user.keys import key_ring
+from app.api.user.outbox import (
+    PROFILE_CREATED,
+    USERNAME_UPDATED,
+    add_event,
+    outbox_dispatcher,
+)
+from app.api.user.token_cache import claim_cache
+from app.api.user.user_cache import CachedUser, user_cache
+from app.api.user.username_index import username_index
 from app.api.user.schemas import (
     GoogleSchema,
     Login,
     ResetPassword,
     User,
 )
-from app.core.config import settings
-from app.database.db import AnSession
+from app.core.logger import bind_user, logger
+from app.database.db import AnSession, dialect_insert
 from app.database.models.user import User as UserDb
+from app.utils.pika_rabbit import rabbit_mq
+from app.utils.helper import username_candidates
 
-pwd_crypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 config_credentials = {
-    "SECRET_KEY": settings.secret_key,
-    "ALGORITHM": "HS256",
     "ACCESS_TOKEN_EXPIRE_MINUTES": timedelta(days=7).total_seconds(),
 }
 security = HTTPBearer()
+SUGGESTION_ROUNDS = 4
 
 authorized_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,11 +49,11 @@ class UserService:
     def __init__(self, session: AnSession = None):
         self.session = session
 
-    def get_password_hash(self, password):
-        return pwd_crypt.hash(password)
+    async def get_password_hash(self, password):
+        return await password_hasher.hash(password)
 
     async def verify_password(self, plain_password, hashed_password):
-        return pwd_crypt.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
 
     def encode_token(self, data: dict, expires_delta=None):
         if expires_delta:
@@ -50,20 +61,12 @@ class UserService:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         data["exp"] = expire
-        encoded_jwt = jwt.encode(
-            data,
-            config_credentials["SECRET_KEY"],
-            algorithm=config_credentials["ALGORITHM"],
-        )
+        encoded_jwt = key_ring.sign(data)
         return encoded_jwt
 
     def decode_token(self, token):
         try:
-            payload = jwt.decode(
-                token,
-                config_credentials["SECRET_KEY"],
-                algorithms=config_credentials["ALGORITHM"],
-            )
+            payload = claim_cache.get_or_decode(token, key_ring.verify)
             return payload["sub"]
         except ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Signature has expired")
@@ -71,50 +74,65 @@ class UserService:
             raise HTTPException(status_code=401, detail="Invalid token")
 
     def auth_wrapper(self, auth: HTTPAuthorizationCredentials = Security(security)):
-        return self.decode_token(token=auth.credentials)
+        user_id = self.decode_token(token=auth.credentials)
+        bind_user(user_id)
+        return user_id
 
     async def create_user(self, user: User) -> User:
-        statement = select(UserDb).where(UserDb.email == user.email)
-        user_details = await self.session.execute(statement)
-        user_details = user_details.scalar_one_or_none()
-        if user_details:
-            raise HTTPException(
-                status_code=400, detail="email already exist, please try a new one"
-            )
-        else:
-            try:
-                password = self.get_password_hash(user.password)
-                user.password = password
-                user_data = user.model_dump()
-                user_data.pop("picture", None)
-                new_user = UserDb(**user_data)
-                self.session.add(new_user)
-                await self.session.commit()
-                await self.session.refresh(new_user)
-
-            except IntegrityError:
-                raise HTTPException(status_code=400, detail="Username is already taken")
-
-            access_token, refresh_token = await generate_jwt_pair(
-                new_user.id, new_user.email
-            )
+        if user.username is None:
+            suggestions = await self.suggest_usernames(user.name, 1)
+            if not suggestions:
+                raise HTTPException(status_code=400, detail="Please choose a username")
+            user.username = suggestions[0]
+        user.password = await self.get_password_hash(user.password)
+        user_data = user.model_dump()
+        user_data.pop("picture", None)
+
+        # The unique constraints on email and username do the existence
+        # check, so a successful signup is a single INSERT ... RETURNING.
+        statement = (
+            dialect_insert(self.session)(UserDb)
+            .values(**user_data)
+            .on_conflict_do_nothing()
+            .returning(UserDb.id)
+        )
+        user_id = (await self.session.execute(statement)).scalar_one_or_none()
+        if user_id is None:
+            await self.session.rollback()
+            statement = select(UserDb.id).where(UserDb.email == user.email)
+            if (await self.session.execute(statement)).first():
+                raise HTTPException(
+                    status_code=400, detail="email already exist, please try a new one"
+                )
+            raise HTTPException(status_code=400, detail="Username is already taken")
+        # the social profile is created from the outbox once this commits
+        profile = {"user_id": user_id, **user.model_dump(exclude={"email", "password"})}
+        profile = {key: str(value) for key, value in profile.items()}
+        await add_event(self.session, user_id, PROFILE_CREATED, profile)
+        await self.session.commit()
+        outbox_dispatcher.notify()
+        await rabbit_mq.publish_message(PROFILE_CREATED, profile)
+        username_index.add(user.username)
 
-            data = {
-                "user_id": new_user.id,
-                "access_token": access_token,
-                "refresh_token": refresh_token,
-                **user.model_dump(),
-            }
-            # automatically subscribe users upon registration
-            # await SubscriberService(session=self.session).subscribe_email(user)
+        access_token, refresh_token = await generate_jwt_pair(user_id, user.email)
 
-            return data
+        data = {
+            "user_id": user_id,
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            **user.model_dump(),
+        }
+        # automatically subscribe users upon registration
+        # await SubscriberService(session=self.session).subscribe_email(user)
+
+        return data
 
     async def login_user(self, login_data: Login):
         user = await self.authenticate_user(login_data.email, login_data.password)
 
         if user is None:
             raise HTTPException(status_code=401, detail="Invalid Email or Password")
+        bind_user(user.id)
         access_token, refresh_token = await generate_jwt_pair(user.id, user.email)
         data = {
             "user_id": user.id,
@@ -128,6 +146,7 @@ class UserService:
         user = await self.session.execute(statement)
         user = user.scalar_one_or_none()
         if user and await self.verify_password(password, user.password):
+            rehash_if_needed(user.id, user.password, password)
             return user
 
         return None
@@ -142,24 +161,25 @@ class UserService:
             raise HTTPException(status_code=401, detail="User does not exist")
 
         # check if current password matches
-        verify_password = pwd_crypt.verify(current_password, user.password)
+        verify_password = await self.verify_password(current_password, user.password)
         if not verify_password:
             raise HTTPException(
                 status_code=401, detail="Current password does not match"
             )
         # check if new password matches old password
-        check_password = pwd_crypt.verify(new_password, user.password)
+        check_password = await self.verify_password(new_password, user.password)
         if check_password:
             raise HTTPException(
                 status_code=401,
                 detail="You have used this password before, try a new one",
             )
 
-        _password = self.get_password_hash(new_password)
+        _password = await self.get_password_hash(new_password)
         user.password = _password
         self.session.add(user)
         await self.session.commit()
         await self.session.refresh(user)
+        await user_cache.invalidate(user.id, user.email)
 
         return {"detail": "Password was updated successfully", "status": True}
 
@@ -215,9 +235,9 @@ class UserService:
                 or
             None
         """
-        statement = select(UserDb).where(UserDb.email == email)
-        user = await self.session.execute(statement)
-        found_user = user.scalar_one_or_none()
+        found_user = await user_cache.get(
+            "email", email, lambda: self._load_user(UserDb.email == email)
+        )
 
         if found_user:
             return found_user
@@ -225,45 +245,96 @@ class UserService:
         raise HTTPException(detail="User not Found", status_code=404)
 
     async def find_by_username(self, username):
-        statement = select(UserDb).where(UserDb.username == username)
-        user = (await self.session.execute(statement)).scalar_one_or_none()
+        if not username_index.might_contain(username):
+            return {"detail": "available", "status": True}
+
+        statement = select(UserDb.id).where(UserDb.username == username).limit(1)
+        user = (await self.session.execute(statement)).first()
+        username_index.record_lookup(taken=user is not None)
 
         if user:
             return {"detail": "unavailable", "status": False}
 
         return {"detail": "available", "status": True}
 
-    async def update_username(self, user_id, username):
-        if not await self.find_by_id(id=user_id):
-            raise HTTPException(status_code=404, detail="User not Found")
-
-        result = await self.find_by_username(username=username)
-        if not result["status"]:
-            raise HTTPException(detail="Username already taken", status_code=400)
+    async def suggest_usernames(self, name, count):
+        """
+        Returns `count` usernames that are free right now. Each round checks
+        a batch of candidates with one `username IN (...)` query and widens
+        the candidate space when too many are taken. The username index only
+        ranks candidates, the ones it has not seen taken are offered first.
+        """
+        suggestions, tried, digits, oversample = [], set(), 2, 2.0
+        for _ in range(SUGGESTION_ROUNDS):
+            wanted = count - len(suggestions)
+            batch = math.ceil(wanted * oversample)
+            candidates = [
+                candidate
+                for candidate in username_candidates(name, batch, digits)
+                if candidate not in tried
+            ]
+            tried.update(candidates)
+
+            likely = set(username_index.likely_free(candidates))
+            available = sorted(
+                await self.free_usernames(candidates),
+                key=lambda candidate: candidate not in likely,
+            )
+            suggestions += available[:wanted]
+            if len(suggestions) >= count:
+                break
+            # size the next batch by how many candidates turned out free
+            oversample = 2 * len(candidates) / max(len(available), 1)
+            digits += 1
+
+        return suggestions
+
+    async def free_usernames(self, candidates: list) -> list:
+        """The candidates no user has taken, checked with one query"""
+        if not candidates:
+            return []
+        statement = select(UserDb.username).where(UserDb.username.in_(candidates))
+        taken = set((await self.session.execute(statement)).scalars())
+        return [candidate for candidate in candidates if candidate not in taken]
 
+    async def update_username(self, user_id, username):
+        # One UPDATE ... RETURNING: no row means no such user, and the
+        # unique constraint on username rejects a taken one.
         stmt = (
             update(UserDb)
             .where(UserDb.id == UUID(user_id))
             .values(username=username)
-            .returning(UserDb)
+            .returning(UserDb.email)
         )
-        await self.session.execute(stmt)
-
-        yield {"user_id": user_id, "username": username}
+        try:
+            updated = (await self.session.execute(stmt)).scalar_one_or_none()
+        except IntegrityError:
+            await self.session.rollback()
+            raise HTTPException(detail="Username already taken", status_code=400)
 
+        if updated is None:
+            raise HTTPException(status_code=404, detail="User not Found")
+        event = {"user_id": str(user_id), "username": username}
+        await add_event(self.session, user_id, USERNAME_UPDATED, event)
         await self.session.commit()
+        outbox_dispatcher.notify()
+        await rabbit_mq.publish_message(USERNAME_UPDATED, event)
+        username_index.add(username)
+        await user_cache.invalidate(user_id, updated)
+
+        return {"user_id": user_id, "username": username}
 
     async def forgot_password(self, email):
         try:
-            await self.find_by_email(email=email)
+            user = await self.find_by_email(email=email)
             # Contact the service to send Email
             stmt = update(UserDb).where(UserDb.email == email).values(password=None)
             await self.session.execute(stmt)
             await self.session.commit()
+            await user_cache.invalidate(user.id, email)
 
         except HTTPException:
-            print("EMAIL NOT SENT")
-            pass
+            logger.info("Password reset asked for an unknown email, nothing sent")
 
         return {
             "detail": "Instructions to reset password has been sent to provided address",
@@ -271,13 +342,13 @@ class UserService:
         }
 
     async def password_reset(self, email, password: ResetPassword):
-        user = self.find_by_email(email)
+        user = await self.find_by_email(email)
 
-        _password = self.get_password_hash(password.new_password)
-        user.password = _password
-        self.session.add(user)
+        _password = await self.get_password_hash(password.new_password)
+        stmt = update(UserDb).where(UserDb.id == user.id).values(password=_password)
+        await self.session.execute(stmt)
         await self.session.commit()
-        await self.session.refresh(user)
+        await user_cache.invalidate(user.id, email)
 
         return {"detail": "Password was updated successfully", "status": True}
 
@@ -293,11 +364,18 @@ class UserService:
                 or
             None
         """
-        statement = select(UserDb).where(UserDb.id == UUID(id))
         try:
-            user = await self.session.execute(statement)
-            found_user = user.scalars().first()
-            return found_user
+            user_id = UUID(str(id))
+            return await user_cache.get(
+                "id", user_id, lambda: self._load_user(UserDb.id == user_id)
+            )
         except Exception as e:
-            print(e)
+            logger.warning(f"Looking up user {id} failed: {e!r}")
             return None
+
+    async def _load_user(self, condition) -> CachedUser:
+        statement = select(*(getattr(UserDb, f) for f in CachedUser._fields)).where(
+            condition
+        )
+        row = (await self.session.execute(statement)).first()
+        return CachedUser(*row) if row else None
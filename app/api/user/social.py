@@ -0,0 +1,141 @@
+import asyncio
+import importlib.util
+import random
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import OUTBOUND_SECONDS
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+
+    def record(self, latency_ms: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.latency_ms_total += latency_ms
+        self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_latency_ms": round(self.latency_ms_total / (self.calls or 1), 3),
+            "max_latency_ms": round(self.latency_ms_max, 3),
+        }
+
+
+class SocialClient:
+    """
+    The one HTTP client a worker uses to call the social service.
+
+    Connections are pooled and kept alive, capped at
+    `social_max_connections`, and every call has explicit connect and read
+    timeouts. Failed attempts are retried with full-jitter exponential
+    backoff: connection failures always, since the request never reached
+    the service, timeouts and 502/503/504 only for idempotent calls.
+    Latency, errors and retries are tracked per endpoint.
+    """
+
+    def __init__(self, base_url: str, transport: httpx.AsyncBaseTransport = None):
+        self.base_url = base_url
+        self.transport = transport
+        self.client: httpx.AsyncClient = None
+        self.endpoints: dict = {}
+
+    async def start(self):
+        if self.client is not None:
+            return
+        http2 = settings.social_http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("SOCIAL_HTTP2 needs httpx[http2], using HTTP/1.1")
+            http2 = False
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=self.transport,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.social_max_connections,
+                max_keepalive_connections=settings.social_max_keepalive,
+            ),
+            timeout=httpx.Timeout(
+                settings.social_read_timeout,
+                connect=settings.social_connect_timeout,
+                pool=settings.social_pool_timeout,
+            ),
+        )
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _backoff(self, attempt: int) -> float:
+        cap = min(settings.social_backoff_max, settings.social_backoff * 2**attempt)
+        return random.uniform(0, cap)
+
+    def _observe(self, stats: EndpointStats, path: str, begin: float, outcome: str):
+        elapsed = time.perf_counter() - begin
+        stats.record(elapsed * 1000, outcome != "ok")
+        OUTBOUND_SECONDS.labels("social", path, outcome).observe(elapsed)
+
+    async def post(self, path: str, json: dict, idempotent: bool) -> httpx.Response:
+        await self.start()
+        stats = self.endpoints.setdefault(path, EndpointStats())
+
+        for attempt in range(settings.social_retries + 1):
+            if attempt:
+                stats.retries += 1
+                await asyncio.sleep(self._backoff(attempt - 1))
+
+            begin = time.perf_counter()
+            try:
+                response = await self.client.post(path, json=json)
+            except (httpx.ConnectError, httpx.PoolTimeout) as e:
+                error, retryable = e, True
+            except httpx.TimeoutException as e:
+                error, retryable = e, idempotent
+            else:
+                failed = response.status_code >= 500
+                self._observe(stats, path, begin, "error" if failed else "ok")
+                if not (idempotent and response.status_code in RETRY_STATUSES):
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {path}",
+                    request=response.request,
+                    response=response,
+                )
+                continue
+
+            self._observe(stats, path, begin, type(error).__name__)
+            if not retryable:
+                raise error
+        raise error
+
+    async def create_profile(self, profile: dict):
+        # Not idempotent on the social side, only retried if never sent
+        return await self.post("api/create/profile", profile, idempotent=False)
+
+    async def update_username(self, user_id, username):
+        return await self.post(
+            "api/update/username",
+            {"user_id": user_id, "username": username},
+            idempotent=True,
+        )
+
+    def stats(self) -> dict:
+        return {path: stats.as_dict() for path, stats in self.endpoints.items()}
+
+
+social_client = SocialClient(str(settings.social_base_url))
@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Callable
+
+from cachetools import TLRUCache
+
+from app.core.config import settings
+
+
+class ClaimCache:
+    """
+    Bounded LRU cache of verified JWT claims keyed by the raw token.
+
+    An entry lives until the token's own `exp` or `max_ttl` seconds,
+    whichever comes first, so an expired token is never served from cache
+    and always goes back through a full decode. Only successful decodes are
+    cached. Lookups take a lock because sync dependencies such as
+    auth_wrapper run in the threadpool, the lock is never held across an
+    await or a decode.
+    """
+
+    def __init__(self, maxsize: int, max_ttl: float) -> None:
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._ttu, timer=time.time)
+
+    def _ttu(self, key, claims: dict, now: float) -> float:
+        return min(claims.get("exp", now), now + self.max_ttl)
+
+    def get_or_decode(
+        self, token: str, decoder: Callable[[str], dict], refresh: bool = False
+    ) -> dict:
+        key = (token, refresh)
+        with self._lock:
+            claims = self._cache.get(key)
+            if claims is not None:
+                self.hits += 1
+                return dict(claims)
+            self.misses += 1
+
+        claims = decoder(token)
+
+        with self._lock:
+            self._cache[key] = claims
+        return dict(claims)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._cache.pop((token, False), None)
+            self._cache.pop((token, True), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+claim_cache = ClaimCache(
+    maxsize=settings.token_cache_size, max_ttl=settings.token_cache_ttl
+)
@@ -0,0 +1,154 @@
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, NamedTuple, Optional
+from uuid import UUID
+
+import orjson
+from cachetools import TTLCache
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class CachedUser(NamedTuple):
+    """
+    What lookups by id or email need of a user. Password hashes are never
+    cached, anything that checks a password reads the row itself.
+    """
+
+    id: UUID
+    name: str
+    email: str
+    username: str
+    date_created: datetime
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(tuple(self))
+
+    @classmethod
+    def loads(cls, data) -> "CachedUser":
+        id, name, email, username, date_created = orjson.loads(data)
+        return cls(
+            UUID(id), name, email, username, datetime.fromisoformat(date_created)
+        )
+
+
+class UserCache:
+    """
+    Read-through cache of users by id and by email.
+
+    L1 is a small per-worker TTL'd LRU, L2 is the cache Redis shared by all
+    workers. A miss on both loads the row and fills both levels under the
+    id and the email key. Writes to a user invalidate both keys in L1 and
+    L2; other workers' L1 copies age out after `user_cache_local_ttl`
+    seconds, which bounds how stale a lookup can be. L2 is off unless
+    `user_cache_redis_url` is set. A failed Redis call makes reads and
+    fills skip L2 for `user_cache_redis_backoff` seconds, so Redis being
+    down costs neither request time nor log lines, only the L2 hits.
+    Invalidations are always attempted.
+    """
+
+    def __init__(self, connection=None) -> None:
+        self.connection = connection  # attached in lifespan
+        self.local = TTLCache(
+            maxsize=settings.user_cache_size, ttl=settings.user_cache_local_ttl
+        )
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.remote_errors = 0
+        self._remote_down_until = 0.0
+
+    @staticmethod
+    def _keys(user_id, email) -> list:
+        return [f"user:id:{user_id}", f"user:email:{email}"]
+
+    async def get(
+        self, field: str, value, load: Callable[[], Awaitable[Optional[CachedUser]]]
+    ) -> Optional[CachedUser]:
+        key = f"user:{field}:{value}"
+        user = self.local.get(key)
+        if user is not None:
+            self.local_hits += 1
+            return user
+
+        user = await self._remote_get(key)
+        if user is not None:
+            self.remote_hits += 1
+            self.local[key] = user
+            return user
+
+        self.misses += 1
+        user = await load()
+        if user is not None:
+            await self.set(user)
+        return user
+
+    async def set(self, user: CachedUser):
+        keys = self._keys(user.id, user.email)
+        for key in keys:
+            self.local[key] = user
+        if not self._remote_available():
+            return
+        data = user.dumps()
+        try:
+            async with self.connection.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, data, ex=settings.user_cache_ttl)
+                await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._remote_failed(e)
+
+    async def invalidate(self, user_id, email):
+        keys = self._keys(user_id, email)
+        for key in keys:
+            self.local.pop(key, None)
+        self.invalidations += 1
+        if self.connection is None:
+            return
+        try:
+            await self.connection.delete(*keys)
+        except (RedisError, OSError) as e:
+            self._remote_failed(e)
+
+    async def _remote_get(self, key) -> Optional[CachedUser]:
+        if not self._remote_available():
+            return None
+        try:
+            data = await self.connection.get(key)
+        except (RedisError, OSError) as e:
+            self._remote_failed(e)
+            return None
+        return CachedUser.loads(data) if data is not None else None
+
+    def _remote_available(self) -> bool:
+        return (
+            self.connection is not None and time.monotonic() >= self._remote_down_until
+        )
+
+    def _remote_failed(self, error: Exception):
+        self.remote_errors += 1
+        self._remote_down_until = time.monotonic() + settings.user_cache_redis_backoff
+        logger.warning(
+            f"User cache Redis call failed, skipping it for "
+            f"{settings.user_cache_redis_backoff:.0f}s: {error}"
+        )
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.remote_hits + self.misses
+        return {
+            "local_entries": len(self.local),
+            "local_hits": self.local_hits,
+            "remote_hits": self.remote_hits,
+            "misses": self.misses,
+            "hit_rate": round(
+                (self.local_hits + self.remote_hits) / lookups if lookups else 0.0, 4
+            ),
+            "invalidations": self.invalidations,
+            "remote_errors": self.remote_errors,
+        }
+
+
+user_cache = UserCache()
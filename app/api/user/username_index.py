@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import math
+import time
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.database.db import database
+from app.database.models.user import User as UserDb
+
+MIN_CAPACITY = 10_000
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter: `in` is never wrong about a missing item and
+    wrong about a present one at roughly `error_rate` once `capacity` items
+    have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def estimated_error_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class UsernameIndex:
+    """
+    Bloom filter of taken usernames in front of the availability check.
+
+    The filter only knows the names taken when it was last rebuilt (every
+    `username_index_rebuild_interval` seconds) plus those this worker wrote
+    since, so it is advisory. A miss means the name is probably free: the
+    keystroke check answers it without touching the database, and other
+    callers use it to rank candidates. It must never decide uniqueness on
+    its own; anything that hands out or stores a username confirms it
+    against the database, where the unique constraint is the source of
+    truth. A hit falls through to an existence query.
+    """
+
+    def __init__(self) -> None:
+        self.filter: BloomFilter = None
+        self.pending: list = None  # usernames added while a rebuild streams
+        self.rebuild_ms = 0.0
+        self.rebuilt_at = None
+        self.negatives = 0
+        self.fall_throughs = 0
+        self.false_positives = 0
+        self._task: asyncio.Task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.exception(f"Rebuilding the username index failed: {e}")
+            await asyncio.sleep(settings.username_index_rebuild_interval)
+
+    async def rebuild(self):
+        begin = time.perf_counter()
+        self.pending = []
+        try:
+            async with database.session() as session:
+                total = await session.scalar(select(func.count()).select_from(UserDb))
+                bloom = BloomFilter(
+                    capacity=max(
+                        MIN_CAPACITY, int(total * settings.username_index_headroom)
+                    ),
+                    error_rate=settings.username_index_error_rate,
+                )
+                usernames = await session.stream_scalars(
+                    select(UserDb.username).execution_options(yield_per=10_000)
+                )
+                async for username in usernames:
+                    bloom.add(username)
+            for username in self.pending:
+                bloom.add(username)
+        finally:
+            self.pending = None
+
+        self.filter = bloom
+        self.rebuild_ms = (time.perf_counter() - begin) * 1000
+        self.rebuilt_at = time.time()
+        logger.info(
+            f"Username index rebuilt with {bloom.count} names "
+            f"in {self.rebuild_ms:.1f}ms"
+        )
+
+    def add(self, username: str):
+        if self.filter is not None:
+            self.filter.add(username)
+        if self.pending is not None:
+            self.pending.append(username)
+
+    def might_contain(self, username: str) -> bool:
+        # Until the first build finishes every check goes to the database.
+        if self.filter is None or username in self.filter:
+            return True
+        self.negatives += 1
+        return False
+
+    def likely_free(self, usernames: list) -> list:
+        """
+        The usernames the filter has not seen taken. Advisory only, names
+        taken by another worker since the last rebuild are in here too.
+        """
+        if self.filter is None:
+            return []
+        return [username for username in usernames if username not in self.filter]
+
+    def record_lookup(self, taken: bool):
+        if self.filter is None:
+            return
+        self.fall_throughs += 1
+        if not taken:
+            self.false_positives += 1
+
+    def stats(self) -> dict:
+        stats = {
+            "ready": self.filter is not None,
+            "rebuild_ms": round(self.rebuild_ms, 3),
+            "rebuilt_at": self.rebuilt_at,
+            "served_without_db": self.negatives,
+            "fall_throughs": self.fall_throughs,
+            "observed_false_positive_rate": (
+                round(self.false_positives / self.fall_throughs, 4)
+                if self.fall_throughs
+                else 0.0
+            ),
+        }
+        if self.filter is not None:
+            stats.update(
+                names=self.filter.count,
+                capacity=self.filter.capacity,
+                size_bytes=len(self.filter.bits),
+                hashes=self.filter.hashes,
+                estimated_false_positive_rate=round(
+                    self.filter.estimated_error_rate(), 6
+                ),
+            )
+        return stats
+
+
+username_index = UsernameIndex()
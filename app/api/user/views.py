@@ -5,22 +5,25 @@ from fastapi import APIRouter, BackgroundTasks, Body, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import EmailStr
 
-import app.utils.helper as utils_helper
-from app.api.user.authentication import refreshJWT
+from app.api.user.authentication import introspect_token, refreshJWT
 from app.api.user.otp import OTPGenerator
 from app.api.user.schemas import (
+    IntrospectionProfile,
     Login,
     MessageProfile,
     OTPVerify,
     PasswordChange,
     ResetPassword,
+    TokenIntrospect,
     User,
     User2,
     UsernameChange,
     UserTokenProfile,
 )
 from app.api.user.services import UserService
-from app.api.user.tasks import create_profile, send_mail, update_username_in_social
+from app.core.config import settings
+from app.core.logger import logger
+from app.email.mail import GmailSender
 from app.database.db import AnSession
 
 router = APIRouter(tags=["Auth-Routes"], prefix="/api/v1/accounts")
@@ -35,8 +38,13 @@ async def check_username_availability(username: str, session: AnSession):
 
 
 @router.post("/suggest/username")
-async def get_username_suggestions(name: Annotated[str, Body(embed=True)]):
-    return utils_helper.username_suggestions(name=name)
+async def get_username_suggestions(
+    name: Annotated[str, Body(embed=True)],
+    session: AnSession,
+    count: Annotated[int, Body(embed=True, ge=1, le=50)] = 6,
+):
+    user_service = UserService(session=session)
+    return await user_service.suggest_usernames(name=name, count=count)
 
 
 @router.patch("/change/username", response_model=MessageProfile)
@@ -46,12 +54,7 @@ async def update_username(
     user_id: UUID = Depends(auth_handler.auth_wrapper),
 ):
     user_service = UserService(session=session)
-    async for item in user_service.update_username(
-        user_id=user_id, username=user_data.new_username
-    ):
-        await update_username_in_social(
-            user_id=item["user_id"], username=item["username"]
-        )
+    await user_service.update_username(user_id=user_id, username=user_data.new_username)
     return {"detail": f"Username updated to {user_data.new_username}", "status": True}
 
 
@@ -65,11 +68,12 @@ async def get_otp(
 
     otp = await otp_gen.get_otp()
 
-    subject = "OTP"
-    message = f"Complete your verification process with this OTP: {otp}"
-
     background_tasks.add_task(
-        send_mail, subject=subject, message=message, recipient_list=[email]
+        GmailSender.send_mail_with_context,
+        context={"otp": otp, "minutes": settings.otp_ttl // 60},
+        recipient_list=[email],
+        subject="OTP",
+        template="otp",
     )
 
     return {"detail": "OTP has been sent to your email", "status": True}
@@ -90,16 +94,10 @@ async def verify_otp(otp_data: OTPVerify, session: AnSession):
 @router.post(
     "/signup", status_code=status.HTTP_201_CREATED, response_model=UserTokenProfile
 )
-async def create_user(
-    user: User, session: AnSession, background_tasks: BackgroundTasks
-):
+async def create_user(user: User, session: AnSession):
     user_service = UserService(session=session)
 
-    result = await user_service.create_user(user)
-
-    background_tasks.add_task(create_profile, result)
-
-    return result
+    return await user_service.create_user(user)
 
 
 # @router.post(
@@ -117,7 +115,7 @@ async def create_user2(
     await user2.save()
 
     data = await User2.all_pks()
-    print(data)
+    logger.debug(f"User2 keys: {data}")
     return {"result": [item for item in data]}
 
 
@@ -141,6 +139,17 @@ async def refresh_token(
     }
 
 
+@router.post("/introspect", response_model=IntrospectionProfile)
+def introspect_tokens(data: TokenIntrospect):
+    """
+    Validates a batch of access or refresh tokens in one round trip, results
+    are returned in request order. Runs in the threadpool since cold tokens
+    need a signature check each.
+    """
+    results = {token: introspect_token(token) for token in dict.fromkeys(data.tokens)}
+    return {"results": [results[token] for token in data.tokens]}
+
+
 @router.patch("/change_password", response_model=MessageProfile)
 async def change_user_password(
     form_data: PasswordChange,
@@ -161,15 +170,12 @@ async def verify_email(
 
     otp = await otp_gen.get_otp()
 
-    subject = ("Forgot Password",)
-    message = f"""
-        You requested to reset your password.
-        Complete the process with this token: {otp}
-
-        """
-    message = f"Complete the process with this token: {otp}"
     background_tasks.add_task(
-        send_mail, subject=subject, message=message, recipient_list=[email]
+        GmailSender.send_mail_with_context,
+        context={"otp": otp},
+        recipient_list=[email],
+        subject="Forgot Password",
+        template="forgot_password",
     )
     return await user_service.forgot_password(email)
 
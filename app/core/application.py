@@ -5,39 +5,81 @@ from aredis_om import get_redis_connection
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.admin.views import router as admin_router
 from app.api.system.views import router as home_router
+from app.api.user.google_certs import google_certs
+from app.api.user.hashing import password_hasher
+from app.api.user.keys import key_ring
+from app.api.user.otp_store import redis_otp_store
+from app.api.user.outbox import outbox_dispatcher
 from app.api.user.schemas import User2
+from app.api.user.social import social_client
+from app.api.user.user_cache import user_cache
+from app.api.user.username_index import username_index
 from app.api.user.views import router as user_router
 from app.core.config import settings
+from app.core.logger import LogContextMiddleware, logger
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilerMiddleware
+from app.core.tracing import trace_sampler
+from app.database.db import database
+from app.email.dispatcher import mail_dispatcher
+from app.email.templating import email_templates
+from app.utils.pika_rabbit import rabbit_mq
 
 # This Redis instance is tuned for durability.
 REDIS_DATA_URL = "redis://localhost:6379"
 
-# This Redis instance is tuned for cache performance.
-REDIS_CACHE_URL = "redis://localhost:6381"
-
 # from
 
 
 @asynccontextmanager
 async def lifespan(api: FastAPI):
-    print("Starting Server and connecting all dependencies")
-    User2.Meta.database = get_redis_connection(
-        url=REDIS_DATA_URL, decode_responses=True
-    )
+    logger.info("Starting Server and connecting all dependencies")
+    if settings.loop_monitor_enabled:
+        await loop_monitor.start()
+    redis_data = get_redis_connection(url=REDIS_DATA_URL, decode_responses=True)
+    User2.Meta.database = redis_data
+    redis_otp_store.connection = redis_data
+    if settings.user_cache_redis_url:
+        # a Redis tuned for cache performance, not the data one above
+        user_cache.connection = get_redis_connection(
+            url=settings.user_cache_redis_url, decode_responses=True
+        )
+    database.connect()
+    key_ring.load()
+    if settings.password_hash_calibrate:
+        await password_hasher.calibrate(settings.password_hash_budget_ms)
+    await password_hasher.start()
+    await google_certs.start()
+    await social_client.start()
+    await outbox_dispatcher.start()
+    email_templates.load()
+    await mail_dispatcher.start()
+    if settings.rabbitmq_enabled:
+        await rabbit_mq.connect_broker()
+    await username_index.start()
 
     if not settings.debug:
         sentry_sdk.init(
             dsn=settings.sentry_logger_url,
-            # Set traces_sample_rate to 1.0 to capture 100%
-            # of transactions for performance monitoring.
-            # We recommend adjusting this value in production,
-            traces_sample_rate=1.0,
+            traces_sampler=trace_sampler.traces_sampler,
+            before_send_transaction=trace_sampler.before_send_transaction,
         )
 
     yield
 
-    print("Closing all resources and shutting down the application")
+    await username_index.stop()
+    await mail_dispatcher.stop()
+    await rabbit_mq.close()
+    await outbox_dispatcher.stop()
+    await social_client.stop()
+    await google_certs.stop()
+    await password_hasher.stop()
+    await database.disconnect()
+    await loop_monitor.stop()
+    logger.info("Closing all resources and shutting down the application")
 
 
 def get_app():
@@ -55,6 +97,7 @@ def get_app():
     # api.include_router(example_router)
     api.include_router(user_router)
     api.include_router(home_router)
+    api.include_router(admin_router)
 
     api.add_middleware(
         CORSMiddleware,
@@ -63,5 +106,9 @@ def get_app():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    api.add_middleware(MetricsMiddleware)
+    if settings.profiler_enabled:
+        api.add_middleware(ProfilerMiddleware)
+    api.add_middleware(LogContextMiddleware)
 
     return api
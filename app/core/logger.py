@@ -1,18 +1,182 @@
+import atexit
 import logging
+import queue
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
 
 from app.core.config import settings
 
-gunicorn_logger = logging.getLogger("gunicorn.error")
+
+class RequestContext:
+    """
+    What log lines emitted while serving a request are tagged with. The
+    route is read from the ASGI scope when a line is logged, since routing
+    happens after the context is created.
+    """
+
+    __slots__ = ("request_id", "scope", "user_id")
+
+    def __init__(self, request_id: str, scope: dict = None) -> None:
+        self.request_id = request_id
+        self.scope = scope or {}
+        self.user_id = None
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return route.path if route is not None else self.scope.get("path")
+
+
+request_context: ContextVar = ContextVar("request_context", default=None)
+
+
+def bind_user(user_id):
+    """Tags the rest of the current request's log lines with a user id"""
+    context = request_context.get()
+    if context is not None:
+        context.user_id = str(user_id)
+
+
+class JSONFormatter(logging.Formatter):
+    """One orjson encoded object per line, formatted in the listener thread"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": record.created,
+            "level": record.levelname,
+            "module": record.module,
+            "message": record.msg,
+        }
+        for key in ("request_id", "route", "user_id", "suppressed"):
+            value = getattr(record, key, None)
+            if value is not None:
+                line[key] = value
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(line, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets each call site log at most `log_site_rate` lines below WARNING per
+    second. The next line let through says how many were suppressed.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sites: dict = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not settings.log_site_rate:
+            return True
+        site = (record.pathname, record.lineno)
+        second = int(record.created)
+        window, count, dropped = self.sites.get(site, (second, 0, 0))
+        if window != second:
+            window, count = second, 0
+        if count >= settings.log_site_rate:
+            self.sites[site] = (window, count, dropped + 1)
+            self.suppressed += 1
+            return False
+        if dropped:
+            record.suppressed = dropped
+        self.sites[site] = (window, count + 1, 0)
+        return True
+
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. The request path only renders
+    the message and tags it with the request context; encoding and writing
+    happen in the listener. When the queue is full records are dropped
+    rather than making requests wait.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        context = request_context.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.route = context.route
+            record.user_id = context.user_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+log_queue = queue.Queue(maxsize=settings.log_queue_size)
+stream_handler = logging.StreamHandler(sys.stderr)
+stream_handler.setFormatter(JSONFormatter())
+queue_handler = RequestQueueHandler(log_queue)
+sampling_filter = SamplingFilter()
+queue_handler.addFilter(sampling_filter)
+listener = QueueListener(log_queue, stream_handler)
+listener.start()
+atexit.register(listener.stop)
+
 logger = logging.getLogger(settings.service_name)
-logger.handlers = gunicorn_logger.handlers
-logger.setLevel(gunicorn_logger.level)
+logger.handlers = [queue_handler]
+logger.setLevel(settings.log_level)
 logger.propagate = False
 
-# Make all log formats consistent
-formatter = logging.Formatter(
-    "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s",
-    "%d/%m/%Y %I:%M:%S %p",
-)
 
-for handler in logger.handlers:
-    handler.setFormatter(formatter)
+def log_stats() -> dict:
+    return {
+        "queued": log_queue.qsize(),
+        "dropped": queue_handler.dropped,
+        "suppressed": sampling_filter.suppressed,
+    }
+
+
+class LogContextMiddleware:
+    """
+    Gives every HTTP request a RequestContext. The request id comes from an
+    incoming `X-Request-ID` header or is generated, and is echoed back.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        context = RequestContext(request_id or uuid.uuid4().hex, scope)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", context.request_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_context.set(context)
+        begin = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.debug(
+                f"{scope['method']} {context.route} "
+                f"{(time.perf_counter() - begin) * 1000:.1f}ms"
+            )
+            request_context.reset(token)
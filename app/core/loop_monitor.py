@@ -0,0 +1,148 @@
+import asyncio
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+
+class LoopBlocked(AssertionError):
+    """Raised by LoopMonitor.check() in tests when the loop was blocked"""
+
+
+@dataclass
+class Stall:
+    lag_ms: float
+    stack: str
+    at: float
+
+    def as_dict(self) -> dict:
+        return {"lag_ms": round(self.lag_ms, 3), "stack": self.stack, "at": self.at}
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs a callback scheduled
+    `loop_monitor_interval_ms` ahead, which is how long anything else
+    waiting on the loop was held up.
+
+    A watchdog thread notices when the loop has not ticked for longer than
+    `loop_stall_threshold_ms`, and snapshots the loop thread's stack while
+    the blocking code is still running. The stall is logged with that
+    stack once the loop resumes. With `loop_block_fail_ms` set, check()
+    raises for every stall longer than that, which the test suite does
+    after each test.
+    """
+
+    def __init__(self) -> None:
+        self.lags: deque = deque(maxlen=1000)
+        self.stalls: deque = deque(maxlen=50)
+        self._unchecked: list = []
+        self._task: asyncio.Task = None
+        self._watchdog: threading.Thread = None
+        self._stopped = threading.Event()
+        self._loop_thread = None
+        self._last_tick = 0.0
+        self._stack = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stopped.set()
+        # the watchdog is a daemon: if it is mid-snapshot, don't hold up
+        # shutdown or the loop waiting for it
+        watchdog, self._watchdog = self._watchdog, None
+        await asyncio.to_thread(watchdog.join, 1.0)
+
+    async def _tick(self):
+        interval = settings.loop_monitor_interval_ms / 1000
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._last_tick = now
+            lag = max(now - expected, 0.0)
+            self.lags.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag * 1000 >= settings.loop_stall_threshold_ms:
+                self._record_stall(lag)
+
+    def _record_stall(self, lag: float):
+        stack, self._stack = self._stack or "", None
+        stall = Stall(lag_ms=lag * 1000, stack=stack, at=time.time())
+        self.stalls.append(stall)
+        self._unchecked.append(stall)
+        LOOP_STALLS.inc()
+        logger.warning(f"Event loop blocked for {stall.lag_ms:.0f}ms\n{stack}")
+
+    def _watch(self):
+        interval = settings.loop_monitor_interval_ms / 1000
+        threshold = settings.loop_stall_threshold_ms / 1000
+        poll = max(threshold / 2, 0.005)
+        last_seen = None
+        while not self._stopped.wait(poll):
+            tick = self._last_tick
+            if tick == last_seen or time.monotonic() - tick < interval + threshold:
+                continue
+            # one snapshot per stall, taken while the loop is still stuck
+            last_seen = tick
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._stack = "".join(traceback.format_stack(frame))
+
+    def reset(self):
+        self._unchecked = []
+
+    def check(self):
+        """Raises LoopBlocked if the loop stalled past `loop_block_fail_ms`"""
+        stalls, self._unchecked = self._unchecked, []
+        limit = settings.loop_block_fail_ms
+        blocked = [stall for stall in stalls if limit and stall.lag_ms > limit]
+        if blocked:
+            raise LoopBlocked(
+                "\n".join(
+                    f"Event loop blocked for {stall.lag_ms:.0f}ms (limit {limit}ms)"
+                    f"\n{stall.stack}"
+                    for stall in blocked
+                )
+            )
+
+    def stats(self) -> dict:
+        lags = [lag * 1000 for lag in self.lags]
+        percentiles = (
+            statistics.quantiles(lags, n=100, method="inclusive")
+            if len(lags) > 1
+            else lags * 99 or [0.0] * 99
+        )
+        return {
+            "running": self._task is not None,
+            "samples": len(lags),
+            "lag_ms_p50": round(percentiles[49], 3),
+            "lag_ms_p95": round(percentiles[94], 3),
+            "lag_ms_p99": round(percentiles[98], 3),
+            "lag_ms_max": round(max(lags, default=0.0), 3),
+            "stalls": [stall.as_dict() for stall in self.stalls],
+        }
+
+
+loop_monitor = LoopMonitor()
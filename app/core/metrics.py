@@ -0,0 +1,148 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# With PROMETHEUS_MULTIPROC_DIR set every worker writes its samples to files
+# there and /metrics in any worker reports the sum over all of them.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being handled",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent hashing or verifying a password in the hasher pool",
+    ["operation"],
+    buckets=REQUEST_BUCKETS,
+)
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    "password_hash_queue_seconds",
+    "Time a hash or verify waited for a free hasher process",
+    ["operation"],
+    buckets=REQUEST_BUCKETS,
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected",
+    "Hash or verify calls turned away because the hasher pool was full",
+)
+JWT_SECONDS = Histogram(
+    "jwt_duration_seconds",
+    "JWT signing and verification time",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time by statement type",
+    ["statement"],
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Database connections checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_connections_open",
+    "Database connections held by the pool",
+    multiprocess_mode="livesum",
+)
+OUTBOUND_SECONDS = Histogram(
+    "http_client_duration_seconds",
+    "Outbound HTTP call latency by service and endpoint",
+    ["service", "endpoint", "outcome"],
+    buckets=REQUEST_BUCKETS,
+)
+SENTRY_TRACES = Counter(
+    "sentry_traces",
+    "Sentry transaction sampling decisions",
+    ["decision"],
+)
+EVENTS_PUBLISHED = Counter(
+    "user_events",
+    "User events by publishing outcome",
+    ["outcome"],
+)
+EVENT_BACKPRESSURE_WAITS = Counter(
+    "user_event_backpressure_waits",
+    "Publishers that waited for room in the full event buffer",
+)
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a scheduled callback",
+    buckets=FAST_BUCKETS,
+)
+LOOP_STALLS = Counter(
+    "event_loop_stalls",
+    "Times the event loop was blocked past loop_stall_threshold_ms",
+)
+
+
+def metrics_payload() -> bytes:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request. Requests are labelled
+    with the route template (`/api/v1/accounts/otp/send/{email}`) rather
+    than the path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        begin = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "<unmatched>",
+                status,
+            ).observe(time.perf_counter() - begin)
@@ -0,0 +1,204 @@
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from app.core.config import settings
+
+PROFILE_HEADER = b"x-profile"
+
+
+def sign_profile_token(ttl: int) -> str:
+    """A header value that profiles any request sent with it for `ttl` seconds"""
+    expires = int(time.time()) + ttl
+    signature = hmac.new(
+        settings.admin_token.encode(), f"profile:{expires}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def valid_profile_token(token: str) -> bool:
+    if not settings.admin_token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(
+        settings.admin_token.encode(), f"profile:{expires}".encode(), hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def collapse(frame) -> str:
+    """A stack as `root;...;leaf`, the collapsed format flamegraph tools read"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename.rpartition("site-packages" + os.sep)[2]
+        if os.path.isabs(filename):
+            filename = os.path.relpath(filename, settings.base_dir)
+        names.append(f"{code.co_qualname} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread every `interval` seconds"""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse(frame)] += 1
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+@dataclass
+class Profile:
+    id: int
+    method: str
+    path: str
+    started_at: datetime
+    route: str = ""
+    status: int = 500
+    duration_ms: float = 0.0
+    samples: Counter = field(default_factory=Counter)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 3),
+            "samples": sum(self.samples.values()),
+            "started_at": self.started_at,
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+
+class RequestProfiler:
+    """
+    Keeps the most recent `profiler_buffer_size` request profiles of this
+    worker. A request is profiled when it carries a valid signed
+    `X-Profile` header (see `sign_profile_token`), or when its path was
+    armed from the admin API.
+    """
+
+    def __init__(self) -> None:
+        self.profiles: deque = deque(maxlen=settings.profiler_buffer_size)
+        self.armed: dict = {}
+        self.active = False
+        self.profiled = 0
+        self.skipped = 0
+        self._next_id = 1
+
+    def arm(self, path: str, count: int = 1):
+        self.armed[path] = self.armed.get(path, 0) + count
+
+    def wanted(self, scope) -> bool:
+        path = scope["path"]
+        if path in self.armed:
+            self.armed[path] -= 1
+            if not self.armed[path]:
+                del self.armed[path]
+            return True
+        if not settings.admin_token:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return valid_profile_token(value.decode("latin-1"))
+        return False
+
+    def start(self, scope) -> Profile:
+        self.active = True
+        profile = Profile(
+            id=self._next_id,
+            method=scope["method"],
+            path=scope["path"],
+            started_at=datetime.utcnow(),
+        )
+        self._next_id += 1
+        return profile
+
+    def finish(self, profile: Profile):
+        self.active = False
+        self.profiled += 1
+        self.profiles.append(profile)
+
+    def get(self, profile_id: int) -> Profile:
+        return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+            "armed": dict(self.armed),
+            "profiles": [profile.summary() for profile in self.profiles],
+        }
+
+
+request_profiler = RequestProfiler()
+
+
+class ProfilerMiddleware:
+    """
+    Samples the event loop's stack while a triggered request runs, see
+    RequestProfiler. Samples cover whatever the loop ran meanwhile, so other
+    requests in flight show up too. One request per worker is profiled at
+    a time. An untriggered request costs one header scan.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler = None) -> None:
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wanted(scope):
+            return await self.app(scope, receive, send)
+        if self.profiler.active:
+            self.profiler.skipped += 1
+            return await self.app(scope, receive, send)
+
+        profile = self.profiler.start(scope)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile.id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = StackSampler(
+            threading.get_ident(), settings.profiler_interval_ms / 1000
+        )
+        begin = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - begin) * 1000
+            profile.samples = sampler.stop()
+            route = scope.get("route")
+            profile.route = route.path if route is not None else ""
+            self.profiler.finish(profile)
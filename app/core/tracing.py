@@ -0,0 +1,128 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.metrics import SENTRY_TRACES
+
+# Trace statuses Sentry gives a transaction that ended in a 5xx or exception
+ERROR_STATUSES = {
+    "internal_error",
+    "unknown_error",
+    "unimplemented",
+    "unavailable",
+    "deadline_exceeded",
+    "data_loss",
+}
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.rstrip("Z"))
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class TraceSampler:
+    """
+    Decides which request transactions are sent to Sentry.
+
+    Requests are sampled when they start, so a dropped one is never
+    recorded: routes matching `sentry_low_value_routes` at
+    `sentry_low_value_sample_rate`, the others at `sentry_traces_sample_rate`
+    and at most `sentry_traces_per_second` a second in this worker.
+
+    Whether a request failed or was slow is only known when it ends, so the
+    few `sentry_tail_sampled_routes` are recorded in full and decided in
+    `before_send_transaction`: errors and requests slower than
+    `sentry_slow_request_ms` are always kept, the rest sampled as above.
+    Each decision is counted.
+    """
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self.clock = clock
+        self.decisions = Counter()
+        self._window = 0
+        self._sent_in_window = 0
+
+    def _count(self, decision: str):
+        self.decisions[decision] += 1
+        SENTRY_TRACES.labels(decision).inc()
+
+    def _matches(self, path: str, routes: list) -> bool:
+        return any(
+            path == route or path.startswith(route.rstrip("/") + "/")
+            for route in routes
+        )
+
+    def _sample(self) -> bool:
+        if random.random() >= settings.sentry_traces_sample_rate:
+            self._count("sampled_out")
+            return False
+        if not self._within_rate():
+            self._count("rate_limited")
+            return False
+        self._count("sampled")
+        return True
+
+    def _within_rate(self) -> bool:
+        window = int(self.clock())
+        if window != self._window:
+            self._window = window
+            self._sent_in_window = 0
+        if self._sent_in_window >= settings.sentry_traces_per_second:
+            return False
+        self._sent_in_window += 1
+        return True
+
+    def traces_sampler(self, context: dict) -> float:
+        if context.get("parent_sampled") is not None:
+            # keep distributed traces whole
+            return float(context["parent_sampled"])
+
+        path = (context.get("asgi_scope") or {}).get("path", "")
+        if self._matches(path, settings.sentry_low_value_routes):
+            if random.random() < settings.sentry_low_value_sample_rate:
+                self._count("low_value_sampled")
+                return 1.0
+            self._count("low_value_dropped")
+            return 0.0
+        if self._matches(path, settings.sentry_tail_sampled_routes):
+            # decided in before_send_transaction
+            return 1.0
+        return 1.0 if self._sample() else 0.0
+
+    def before_send_transaction(self, event: dict, hint: dict):
+        if not self._matches(
+            event.get("transaction", ""), settings.sentry_tail_sampled_routes
+        ):
+            # already sampled when the request started
+            return event
+
+        status = event.get("contexts", {}).get("trace", {}).get("status")
+        if status in ERROR_STATUSES:
+            self._count("error")
+            return event
+
+        duration = _timestamp(event["timestamp"]) - _timestamp(event["start_timestamp"])
+        if duration * 1000 >= settings.sentry_slow_request_ms:
+            self._count("slow")
+            return event
+        return event if self._sample() else None
+
+    def stats(self) -> dict:
+        kept = ("error", "slow", "sampled", "low_value_sampled")
+        return {
+            "kept": sum(self.decisions[decision] for decision in kept),
+            "dropped": sum(
+                count
+                for decision, count in self.decisions.items()
+                if decision not in kept
+            ),
+            **self.decisions,
+        }
+
+
+trace_sampler = TraceSampler()
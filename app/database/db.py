@@ -1,40 +1,185 @@
+import os
+import time
 from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy import inspect
+from sqlalchemy import event, inspect, make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
+from app.core.metrics import (
+    DB_POOL_IN_USE,
+    DB_POOL_SIZE,
+    DB_POOL_WAIT_SECONDS,
+    DB_QUERY_SECONDS,
+)
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.failures = 0
+
+    def record(self, wait_ms: float):
+        self.checkouts += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection"""
+
+    def connect(self):
+        begin = time.perf_counter()
+        try:
+            return super().connect()
+        except Exception:
+            pool_stats.failures += 1
+            raise
+        finally:
+            waited = time.perf_counter() - begin
+            pool_stats.record(waited * 1000)
+            DB_POOL_WAIT_SECONDS.observe(waited)
+
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_QUERY_SECONDS.labels(verb).observe(time.perf_counter() - context._query_started)
+
+
+def _pool_usage_changed(pool):
+    def update(*args):
+        DB_POOL_IN_USE.set(pool.checkedout())
+        DB_POOL_SIZE.set(pool.checkedout() + pool.checkedin())
+
+    return update
+
+
+def instrument(engine: AsyncEngine):
+    """Feeds statement timings and pool usage of an engine into the metrics"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _query_started)
+    event.listen(engine.sync_engine, "after_cursor_execute", _query_finished)
+    update = _pool_usage_changed(engine.pool)
+    for name in ("checkout", "checkin", "close", "detach"):
+        event.listen(engine.pool, name, update)
+
+
+class Database:
+    """
+    Owns the engine and session factory of a worker. Both are built once in
+    lifespan (after gunicorn forks), or on first use outside the app such as
+    CLI scripts.
+    """
+
+    def __init__(self) -> None:
+        self.engine: AsyncEngine = None
+        self.session_factory: async_sessionmaker = None
+
+    def connect(self):
+        if self.engine is not None:
+            return
+
+        pool_options = {
+            "poolclass": TimedQueuePool,
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_pre_ping": settings.db_pool_pre_ping,
+        }
+        if settings.debug:
+            self.engine = create_async_engine(
+                "sqlite+aiosqlite:///./test.db",
+                echo=settings.db_echo,
+                future=True,
+                connect_args={"check_same_thread": False},
+                **pool_options,
+            )
+        else:
+            url = make_url(settings.database_url.__str__())
+            connect_args = {}
+            # only asyncpg knows this option, other drivers reject it
+            if url.get_driver_name() == "asyncpg":
+                connect_args["prepared_statement_cache_size"] = (
+                    settings.db_statement_cache_size
+                )
+            self.engine = create_async_engine(
+                url,
+                echo=settings.db_echo,
+                future=True,
+                connect_args=connect_args,
+                **pool_options,
+            )
+
+        instrument(self.engine)
+        self.session_factory = async_sessionmaker(
+            bind=self.engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+        )
+
+    async def disconnect(self):
+        if self.engine is None:
+            return
+        await self.engine.dispose()
+        self.engine = None
+        self.session_factory = None
+
+    def session(self) -> AsyncSession:
+        self.connect()
+        return self.session_factory()
+
+    def pool_status(self) -> dict:
+        status = {
+            "pid": os.getpid(),
+            "checkouts": pool_stats.checkouts,
+            "checkout_failures": pool_stats.failures,
+            "avg_checkout_wait_ms": round(
+                pool_stats.wait_ms_total / (pool_stats.checkouts or 1), 3
+            ),
+            "max_checkout_wait_ms": round(pool_stats.wait_ms_max, 3),
+        }
+        if self.engine is not None:
+            pool = self.engine.pool
+            status.update(
+                size=pool.size(),
+                in_use=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=pool.overflow(),
+            )
+        return status
+
+
+database = Database()
 
-if settings.debug:
-    async_engine = create_async_engine(
-        "sqlite+aiosqlite:///./test.db",
-        echo=settings.db_echo,
-        future=True,
-        connect_args={"check_same_thread": False},
-    )
 
-else:
-    async_engine = create_async_engine(
-        settings.database_url.__str__(),
-        echo=settings.db_echo,
-        future=True,
-    )
+def dialect_insert(session: AsyncSession):
+    """insert() construct of the session's dialect, which has ON CONFLICT"""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
 
 
 async def db_session() -> AsyncSession:
-    async_session = async_sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
-    async with async_session() as session:
+    async with database.session() as session:
         yield session
 
 
@@ -0,0 +1,30 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import JSON, BigInteger, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database.db import Base
+
+
+class OutboxEvent(Base):
+    """
+    A user event waiting to be delivered to the social service. Rows are
+    written in the same transaction as the change they describe and
+    deleted once delivered; the integer id gives the delivery order.
+    """
+
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    user_id: Mapped[UUID] = mapped_column(index=True)
+    event: Mapped[str]
+    payload: Mapped[dict] = mapped_column(JSON)
+    attempts: Mapped[int] = mapped_column(default=0)
+    available_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)
+    date_created: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<OutboxEvent (id: {self.id}, event: {self.event})>"
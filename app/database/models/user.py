@@ -1,5 +1,6 @@
 from uuid import UUID
 
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database.db import Base
@@ -14,6 +15,9 @@ class User(UUIDMixin, Base):
     username: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str] = mapped_column(nullable=True)
 
+    # keyset order of the user export
+    __table_args__ = (Index("ix_users_date_created_id", "date_created", "id"),)
+
     def __repr__(self):
         return f"<User (id: {self.id})>"
 
@@ -22,4 +26,4 @@ class OTP(UUIDMixin, Base):
     __tablename__ = "otp"
 
     counter: Mapped[int] = mapped_column(default=1)
-    user_id: Mapped[UUID]
+    user_id: Mapped[UUID] = mapped_column(unique=True, index=True)
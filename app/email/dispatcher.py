@@ -0,0 +1,251 @@
+import asyncio
+import random
+import smtplib
+import ssl
+import time
+from email.message import EmailMessage
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def session_lost(error: OSError) -> bool:
+    # SMTPException subclasses OSError, only a disconnect loses the session
+    return isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(
+        error, smtplib.SMTPException
+    )
+
+
+class ConsoleSMTP:
+    """The `console` mail backend: prints messages instead of sending them"""
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b"OK"
+
+    def send_message(self, message: EmailMessage):
+        logger.info(f"Console mail backend:\n{message}")
+
+    def quit(self):
+        pass
+
+
+def smtp_connect():
+    if settings.mail_backend == "console":
+        return ConsoleSMTP()
+    if settings.smtp_ssl:
+        smtp = smtplib.SMTP_SSL(
+            settings.smtp_host,
+            settings.smtp_port,
+            context=ssl.create_default_context(),
+            timeout=settings.smtp_timeout,
+        )
+    else:
+        smtp = smtplib.SMTP(
+            settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout
+        )
+    if settings.email_password:
+        try:
+            smtp.login(settings.smtp_username, settings.email_password)
+        except Exception:
+            smtp.close()
+            raise
+    return smtp
+
+
+class SMTPConnection:
+    """
+    A long-lived, logged in SMTP session. Only ever used from one worker
+    at a time, its blocking calls run in a thread. The session is replaced
+    when it has been idle past `mail_idle_timeout` (servers drop idle
+    clients) or when a NOOP shows it is gone.
+    """
+
+    def __init__(self, connect=smtp_connect) -> None:
+        self.connect = connect
+        self.smtp = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    def _ensure(self):
+        idle = time.monotonic() - self.last_used
+        if self.smtp is not None and idle > settings.mail_idle_timeout:
+            try:
+                self.smtp.noop()
+            except OSError:
+                self.smtp = None
+        if self.smtp is None:
+            self.smtp = self.connect()
+            self.connects += 1
+
+    def send_batch(self, messages: list) -> list:
+        """Sends messages over one session, returns (message, error) failures"""
+        failures = []
+        for index, message in enumerate(messages):
+            try:
+                self._ensure()
+                self.smtp.send_message(message)
+                self.last_used = time.monotonic()
+            except smtplib.SMTPAuthenticationError as e:
+                # every other message would fail the same login
+                failures += [(message, e) for message in messages[index:]]
+                break
+            except OSError as e:
+                if not session_lost(e):
+                    failures.append((message, e))
+                    continue
+                # the session is gone, the rest of the batch is retried
+                self.smtp = None
+                failures += [(message, e) for message in messages[index:]]
+                break
+        return failures
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, OSError) and session_lost(error)
+
+
+class MailDispatcher:
+    """
+    Sends mail from a bounded queue over a small pool of SMTP connections.
+
+    Each of the `mail_connections` workers owns one connection and takes up
+    to `mail_batch_size` queued messages per round, so several messages go
+    out over one session. Transient failures (dropped connections, 4xx
+    replies) are retried with jittered exponential backoff, up to
+    `mail_retries` times. Stopping drains the queue first. Before start()
+    (scripts, tests) messages are sent right away over a one-off connection.
+    """
+
+    def __init__(self, connect=smtp_connect) -> None:
+        self.connect = connect
+        self.queue: asyncio.Queue = None
+        self.connections: list = []
+        self._workers: list = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.send_ms_total = 0.0
+
+    async def start(self):
+        if self._workers:
+            return
+        self.queue = asyncio.Queue(maxsize=settings.mail_queue_size)
+        for _ in range(settings.mail_connections):
+            connection = SMTPConnection(self.connect)
+            self.connections.append(connection)
+            self._workers.append(asyncio.create_task(self._work(connection)))
+
+    async def stop(self, timeout: float = 10.0):
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} unsent emails")
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        for connection in self.connections:
+            await asyncio.to_thread(connection.close)
+        self.connections = []
+
+    async def send(self, message: EmailMessage, wait: bool = True) -> bool:
+        """Queues a message, False if the queue was full and wait is False"""
+        if not self._workers:
+            connection = SMTPConnection(self.connect)
+            try:
+                failures = await asyncio.to_thread(connection.send_batch, [message])
+            finally:
+                await asyncio.to_thread(connection.close)
+            if failures:
+                raise failures[0][1]
+            self.sent += 1
+            return True
+
+        if wait:
+            await self.queue.put(message)
+            return True
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def _work(self, connection: SMTPConnection):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < settings.mail_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._deliver(connection, batch)
+            except Exception as e:
+                logger.exception(f"Sending {len(batch)} emails failed: {e}")
+                self.failed += len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _deliver(self, connection: SMTPConnection, batch: list):
+        for attempt in range(settings.mail_retries + 1):
+            if attempt:
+                self.retried += len(batch)
+                cap = min(settings.mail_backoff_max, settings.mail_backoff * 2**attempt)
+                await asyncio.sleep(random.uniform(0, cap))
+
+            begin = time.perf_counter()
+            failures = await asyncio.to_thread(connection.send_batch, batch)
+            self.send_ms_total += (time.perf_counter() - begin) * 1000
+            self.sent += len(batch) - len(failures)
+
+            batch = []
+            if failures and isinstance(
+                failures[-1][1], smtplib.SMTPAuthenticationError
+            ):
+                self.failed += len(failures)
+                logger.error(f"SMTP login failed, dropping {len(failures)} emails")
+                return
+            for message, error in failures:
+                if is_transient(error):
+                    batch.append(message)
+                else:
+                    self.failed += 1
+                    logger.error(f"Could not send to {message['to']}: {error!r}")
+            if not batch:
+                return
+
+        self.failed += len(batch)
+        logger.error(f"Gave up on {len(batch)} emails after retries")
+
+    def stats(self) -> dict:
+        return {
+            "backend": settings.mail_backend,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "connections": len(self.connections),
+            "connects": sum(connection.connects for connection in self.connections),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "avg_send_ms": round(self.send_ms_total / (self.sent or 1), 3),
+        }
+
+
+mail_dispatcher = MailDispatcher()
@@ -1,85 +1,94 @@
-import smtplib
-import ssl
+import asyncio
 from email.message import EmailMessage
 
 from app.core.config import settings
+from app.email.dispatcher import mail_dispatcher
+from app.email.templating import email_templates
 
 
 class GmailSender:
     @staticmethod
-    def send_mail(
+    def build_message(
         subject: str,
         message: str,
         recipient_list: list,
         from_email: str = None,
-        fail_silently: bool = False,
         html_message: str = None,
         template_path: str = None,
-    ):
+    ) -> EmailMessage:
         email = EmailMessage()
         email["from"] = from_email or settings.default_from_email
         email["to"] = recipient_list
         email["subject"] = subject
         email.set_content(message)
 
-        print(message)
-
-        # if html_message:
-        #     email.add_alternative(html_message, subtype="html")
-        # elif template_path:
-        #     with open(template_path, "r") as template_file:
-        #         html_content = template_file.read()
-        #     email.add_alternative(html_content, subtype="html")
+        if html_message:
+            email.add_alternative(html_message, subtype="html")
+        elif template_path:
+            with open(template_path, "r") as template_file:
+                html_content = template_file.read()
+            email.add_alternative(html_content, subtype="html")
+        return email
 
-        # context = ssl.create_default_context()
-
-        # try:
-        #     with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
-        #             smtp.login(settings.default_from_email, settings.email_password)
-        #             smtp.send_message(email)
-        # except Exception as e:
-        #     if not fail_silently:
-        #         raise e
+    @staticmethod
+    async def send_mail(
+        subject: str,
+        message: str,
+        recipient_list: list,
+        from_email: str = None,
+        fail_silently: bool = False,
+        html_message: str = None,
+        template_path: str = None,
+    ):
+        """Queues the email on the mail dispatcher, which sends it over SMTP"""
+        email = GmailSender.build_message(
+            subject=subject,
+            message=message,
+            recipient_list=recipient_list,
+            from_email=from_email,
+            html_message=html_message,
+            template_path=template_path,
+        )
+        try:
+            await mail_dispatcher.send(email)
+        except Exception as e:
+            if not fail_silently:
+                raise e
 
     @staticmethod
-    def send_mail_with_context(
+    async def send_mail_with_context(
         context: dict,
-        from_email: str,
         recipient_list: list,
         subject: str,
-        template_path: str,
+        template: str,
+        from_email: str = None,
     ):
-        # Read the template file
-        with open(template_path, "r") as template_file:
-            html_template = template_file.read()
-
-        # Apply context data to the template
-        formatted_html = html_template.format(**context)
+        """Sends the text and html parts of a registered email template"""
+        message, html_message = email_templates.render(template, context)
 
-        GmailSender.send_mail(
+        await GmailSender.send_mail(
             subject=subject,
-            message="Text message content",
+            message=message,
             from_email=from_email,
             recipient_list=recipient_list,
-            html_message=formatted_html,
+            html_message=html_message,
         )
 
 
 # Example usage:
 if __name__ == "__main__":
     email_sender = "rW8XK@example.com"
-    email_app_password = "password"
     email_recipient = "rW8XK@example.com"
     email_subject = "Test"
     email_body = "Test"
     template_path = "path/to/your/template.html"
 
-    GmailSender.send_mail(
-        subject=email_subject,
-        message=email_body,
-        from_email=email_sender,
-        recipient_list=email_recipient,
-        auth_user=email_sender,
-        auth_password=email_app_password,
-        template_path=template_path,
+    asyncio.run(
+        GmailSender.send_mail(
+            subject=email_subject,
+            message=email_body,
+            from_email=email_sender,
+            recipient_list=email_recipient,
+            template_path=template_path,
+        )
     )
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+    TemplateNotFound,
+    select_autoescape,
+)
+
+from app.core.config import settings
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+
+class TemplateRegistry:
+    """
+    Email templates, compiled once.
+
+    `load` (run in lifespan) compiles every template in the directory and
+    keeps them in the environment's cache, with compiled bytecode also
+    written to a bytecode cache so the next process skips the compile. In
+    debug mode templates are reloaded when their file changes. An email
+    named `otp` is rendered from `otp.txt` and, if present, `otp.html`.
+    """
+
+    def __init__(self, directory: Path = TEMPLATE_DIR) -> None:
+        self.directory = directory
+        self.env: Environment = None
+
+    def load(self):
+        self.env = Environment(
+            loader=FileSystemLoader(self.directory),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            auto_reload=settings.debug,
+            cache_size=-1,
+            bytecode_cache=(
+                FileSystemBytecodeCache(settings.email_template_cache_dir)
+                if settings.email_template_bytecode_cache
+                else None
+            ),
+        )
+        for name in self.env.list_templates():
+            self.env.get_template(name)
+
+    def render(self, name: str, context: dict) -> tuple:
+        """The text and html (None without an html template) parts of an email"""
+        if self.env is None:
+            self.load()
+        text = self.env.get_template(f"{name}.txt").render(context)
+        try:
+            html = self.env.get_template(f"{name}.html").render(context)
+        except TemplateNotFound:
+            html = None
+        return text, html
+
+
+email_templates = TemplateRegistry()
@@ -1,32 +1,24 @@
 from uuid import uuid4
 
 
-def create_custom_username(name: str) -> str:
-    username = name.split(" ")[0]
-    random_digit = uuid4().int % 100
-    return f"{username}{random_digit}"
-
-
-def username_suggestions(name: str) -> list:
-    suggestions = []
-
-    for _ in range(2):
-        username = name.split(" ")[0]
-        random_digit = uuid4().int % 100
-
-        suggestions.append(f"{username}{random_digit}")
-
-    if len(name.split(" ")) > 1:
-        for _ in range(2):
-            username = name.split(" ")[1]
-            random_digit = uuid4().int % 100
-
-            suggestions.append(f"{username}{random_digit}")
-
-        for _ in range(2):
-            username = name.split(" ")
-            random_digit = uuid4().int % 100
-
-            suggestions.append(f"{username[0]}-{username[1]}{random_digit}")
-
-    return suggestions
+def username_candidates(name: str, count: int, digits: int = 2) -> list:
+    """
+    Unique random usernames built from a name: first name, last name and
+    first-last, each followed by random digits. More digits are used when
+    `count` would not fit comfortably in the space of `digits` digits.
+    """
+    parts = name.split(" ")
+    stems = [parts[0]]
+    if len(parts) > 1:
+        stems += [parts[1], f"{parts[0]}-{parts[1]}"]
+
+    while len(stems) * 10**digits < count * 2:
+        digits += 1
+
+    candidates = {}
+    while len(candidates) < count:
+        stem = stems[len(candidates) % len(stems)]
+        random_digit = uuid4().int % 10**digits
+        candidates[f"{stem}{random_digit}"] = None
+
+    return list(candidates)
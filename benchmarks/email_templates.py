@@ -0,0 +1,80 @@
+"""
+Render time per OTP email, old style against the template registry.
+
+    python -m benchmarks.email_templates --batch 10000
+
+"read + format" is what send_mail_with_context used to do per message:
+open the template file, read it and str.format it, html part only.
+"jinja per message" reads and compiles the same Jinja templates for every
+message, "registry" renders the text and html parts from templates
+compiled once at load.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.email.templating import TEMPLATE_DIR, TemplateRegistry
+
+
+def read_and_format(legacy_template, batch):
+    for i in range(batch):
+        with open(legacy_template, "r") as template_file:
+            html_template = template_file.read()
+        html_template.format(otp=f"{i:06}", minutes=5)
+
+
+def jinja_per_message(batch):
+    for i in range(batch):
+        # cache_size=0 compiles on every get_template
+        env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(["html"]),
+            cache_size=0,
+        )
+        context = {"otp": f"{i:06}", "minutes": 5}
+        env.get_template("otp.txt").render(context)
+        env.get_template("otp.html").render(context)
+
+
+def registry_render(registry, batch):
+    for i in range(batch):
+        registry.render("otp", {"otp": f"{i:06}", "minutes": 5})
+
+
+def report(label, elapsed, batch):
+    print(f"{label:<20}{elapsed / batch * 1e6:8.1f} us/message")
+
+
+def main(batch):
+    begin = time.perf_counter()
+    registry = TemplateRegistry()
+    registry.load()
+    print(f"{'registry load':<20}{(time.perf_counter() - begin) * 1000:8.1f} ms once")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the same html as a flat file with str.format placeholders
+        _, html = registry.render("otp", {"otp": "{otp}", "minutes": "{minutes}"})
+        legacy_template = Path(directory) / "otp.html"
+        legacy_template.write_text(html)
+
+        begin = time.perf_counter()
+        read_and_format(legacy_template, batch)
+        report("read + format", time.perf_counter() - begin, batch)
+
+    begin = time.perf_counter()
+    jinja_per_message(batch)
+    report("jinja per message", time.perf_counter() - begin, batch)
+
+    begin = time.perf_counter()
+    registry_render(registry, batch)
+    report("registry", time.perf_counter() - begin, batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=10000)
+    main(parser.parse_args().batch)
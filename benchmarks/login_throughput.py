@@ -0,0 +1,80 @@
+"""
+Login throughput under concurrency, before and after moving bcrypt off the
+event loop.
+
+    python -m benchmarks.login_throughput --concurrency 32 --logins 256
+
+"inline" verifies on the event loop the way the login route used to,
+"pool" goes through the PasswordHasher process pool. Alongside throughput
+the worst event loop stall is reported, which is what every other request
+on the worker experiences while a login is in progress.
+"""
+import argparse
+import asyncio
+import time
+
+from app.api.user.hashing import PasswordHasher, pwd_crypt
+
+PASSWORD = "correct horse battery staple"
+
+
+async def inline_verify(hashed):
+    return pwd_crypt.verify(PASSWORD, hashed)
+
+
+async def measure_lag(stop: asyncio.Event, interval=0.005):
+    worst = 0.0
+    while not stop.is_set():
+        begin = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - begin - interval)
+    return worst
+
+
+async def run(label, verify, hashed, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            assert await verify(hashed)
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_lag(stop))
+    begin = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    worst_lag = await lag
+
+    print(
+        f"{label:>6}: {logins / elapsed:8.1f} logins/s  "
+        f"total={elapsed:6.2f}s  worst loop stall={worst_lag * 1000:7.1f}ms"
+    )
+
+
+async def main(logins, concurrency, workers):
+    hashed = pwd_crypt.hash(PASSWORD)
+    await run("inline", inline_verify, hashed, logins, concurrency)
+
+    hasher = PasswordHasher(workers=workers, max_pending=logins)
+    await hasher.start()
+    try:
+        await run(
+            "pool",
+            lambda h: hasher.verify(PASSWORD, h),
+            hashed,
+            logins,
+            concurrency,
+        )
+        print(f" stats: {hasher.stats.as_dict()}")
+    finally:
+        await hasher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency, args.workers))
@@ -0,0 +1,89 @@
+"""
+Emails per second through the mail dispatcher against a local SMTP server.
+
+    python -m benchmarks.mail_throughput --messages 500
+
+Needs aiosmtpd (pip install aiosmtpd), which runs the stand-in server in
+a background thread. Compares a fresh session per message, which is what
+GmailSender did before the dispatcher, with the pooled dispatcher at a
+few connection counts.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.core.config import settings
+from app.email.dispatcher import MailDispatcher, SMTPConnection
+from app.email.mail import GmailSender
+
+
+class CountingHandler:
+    def __init__(self) -> None:
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def messages(count):
+    return [
+        GmailSender.build_message(
+            subject="OTP",
+            message=f"Complete your verification process with this OTP: {i:06}",
+            recipient_list=[f"user{i}@example.com"],
+        )
+        for i in range(count)
+    ]
+
+
+def per_message_sessions(batch):
+    for message in batch:
+        connection = SMTPConnection()
+        connection.send_batch([message])
+        connection.close()
+
+
+async def pooled(batch, connections):
+    settings.mail_connections = connections
+    dispatcher = MailDispatcher()
+    await dispatcher.start()
+    for message in batch:
+        await dispatcher.send(message)
+    await dispatcher.stop()
+
+
+async def main(count):
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025)
+    controller.start()
+    settings.mail_backend = "smtp"
+    settings.smtp_host, settings.smtp_port = "127.0.0.1", 8025
+    settings.smtp_ssl = False
+    settings.email_password = ""
+
+    try:
+        begin = time.perf_counter()
+        await asyncio.to_thread(per_message_sessions, messages(count))
+        elapsed = time.perf_counter() - begin
+        print(f"session per message       {count / elapsed:8.0f} emails/s")
+
+        for connections in (1, 2, 4):
+            begin = time.perf_counter()
+            await pooled(messages(count), connections)
+            elapsed = time.perf_counter() - begin
+            print(
+                f"dispatcher, {connections} connections  {count / elapsed:8.0f} emails/s"
+            )
+    finally:
+        controller.stop()
+    print(f"server received {handler.received} emails")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    asyncio.run(main(parser.parse_args().messages))
@@ -0,0 +1,86 @@
+"""
+Queries per username suggestion request as the number of suggestions grows.
+
+    python -m benchmarks.username_suggestions --users 20000
+
+Seeds an in-memory database with users whose usernames collide with the
+suggestion candidates, then counts the statements suggest_usernames runs
+for increasing counts, with and without the username index built.
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.api.user.services import UserService
+from app.api.user.username_index import BloomFilter, username_index
+from app.database.db import Base
+from app.database.models.user import User as UserDb
+
+NAME = "Ada Lovelace"
+COUNTS = (5, 25, 50, 100, 200)
+
+
+async def main(users):
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        usernames = [f"Ada{i}" for i in range(users // 2)] + [
+            f"Lovelace{i}" for i in range(users // 2)
+        ]
+        await connection.execute(
+            insert(UserDb),
+            [
+                {
+                    "id": uuid4(),
+                    "name": NAME,
+                    "email": f"{username}@example.com",
+                    "username": username,
+                }
+                for username in usernames
+            ],
+        )
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+
+    for label, build_index in (("no index", False), ("index", True)):
+        username_index.filter = None
+        if build_index:
+            username_index.filter = BloomFilter(capacity=users * 2, error_rate=0.01)
+            for username in usernames:
+                username_index.filter.add(username)
+
+        for count in COUNTS:
+            statements.clear()
+            async with AsyncSession(engine) as session:
+                begin = time.perf_counter()
+                suggestions = await UserService(session=session).suggest_usernames(
+                    name=NAME, count=count
+                )
+                elapsed = (time.perf_counter() - begin) * 1000
+            print(
+                f"{label:>8}: count={count:<4} returned={len(suggestions):<4} "
+                f"queries={len(statements)}  {elapsed:7.2f}ms"
+            )
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users))
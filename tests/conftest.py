@@ -1,9 +1,14 @@
+import os
 from typing import Generator
 
 import pytest
 from fastapi.testclient import TestClient
 
-from app.core.application import get_app
+# Handlers that hold the event loop this long fail the test they ran in
+os.environ.setdefault("LOOP_BLOCK_FAIL_MS", "500")
+
+from app.core.application import get_app  # noqa: E402
+from app.core.loop_monitor import loop_monitor  # noqa: E402
 
 
 @pytest.fixture(scope="module")
@@ -11,3 +16,10 @@ def client() -> Generator:
     api = get_app()
     with TestClient(api) as c:
         yield c
+
+
+@pytest.fixture(autouse=True)
+def fail_on_blocked_loop():
+    loop_monitor.reset()
+    yield
+    loop_monitor.check()
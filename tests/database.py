@@ -0,0 +1,35 @@
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database.db import Base
+from app.database.models import outbox, user  # noqa: F401
+
+
+@asynccontextmanager
+async def sqlite_session():
+    """
+    A session on a fresh in-memory database, along with the list of SQL
+    statements it executes.
+    """
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session, statements
+    finally:
+        await engine.dispose()
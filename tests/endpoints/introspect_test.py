@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+from app.api.user.authentication import create_access_token
+
+
+def test_introspect_reports_each_token_in_order(client: TestClient):
+    token = create_access_token({"user_id": "user-id", "email": "a@b.com"})
+    res = client.post(
+        "/api/v1/accounts/introspect", json={"tokens": [token, "not-a-token", token]}
+    )
+
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert [result["active"] for result in results] == [True, False, True]
+    assert results[0]["sub"] == "user-id"
+    assert results[1]["sub"] is None
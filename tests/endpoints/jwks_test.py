@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.api.user.authentication import create_access_token
+
+
+def test_jwks_verifies_issued_tokens(client: TestClient):
+    token = create_access_token({"user_id": "user-id", "email": "a@b.com"})
+    res = client.get("/.well-known/jwks.json")
+
+    assert res.status_code == 200
+    assert "max-age" in res.headers["cache-control"]
+
+    kid = jwt.get_unverified_header(token)["kid"]
+    key = next(key for key in res.json()["keys"] if key["kid"] == kid)
+    assert jwt.decode(token, key, algorithms=["RS256"])["sub"] == "user-id"
+
+
+def test_jwks_honours_etag(client: TestClient):
+    etag = client.get("/.well-known/jwks.json").headers["etag"]
+    res = client.get("/.well-known/jwks.json", headers={"If-None-Match": etag})
+
+    assert res.status_code == 304
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+from app.api.user.authentication import create_access_token
+
+
+def test_requests_are_labelled_by_route_template(client: TestClient):
+    client.get("/.well-known/jwks.json")
+    client.get("/api/v1/no/such/route")
+    body = client.get("/metrics").text
+
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/.well-known/jwks.json",status="200"}'
+    ) in body
+    assert 'route="<unmatched>",status="404"' in body
+
+
+def test_metrics_cover_jwt_and_database(client: TestClient):
+    create_access_token({"user_id": "user-id", "email": "a@b.com"})
+    res = client.get("/metrics")
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert 'jwt_duration_seconds_count{operation="encode"}' in res.text
+    assert "db_pool_wait_seconds" in res.text
+    assert "password_hash_duration_seconds" in res.text
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.profiling import ProfilerMiddleware, RequestProfiler, sign_profile_token
+
+
+def busy_work(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    return "admin-secret"
+
+
+@pytest.fixture
+def profiled_app():
+    app = FastAPI()
+    profiler = RequestProfiler()
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
+    @app.get("/slow/{item}")
+    async def slow(item: str):
+        busy_work(0.05)
+        return {"item": item}
+
+    return TestClient(app), profiler
+
+
+def test_only_signed_requests_are_profiled(profiled_app, admin_token):
+    client, profiler = profiled_app
+
+    assert "x-profile-id" not in client.get("/slow/1").headers
+    forged = client.get("/slow/1", headers={"X-Profile": "9999999999.forged"})
+    assert "x-profile-id" not in forged.headers
+    expired = client.get("/slow/1", headers={"X-Profile": sign_profile_token(-1)})
+    assert "x-profile-id" not in expired.headers
+
+    res = client.get("/slow/1", headers={"X-Profile": sign_profile_token(60)})
+    profile = profiler.get(int(res.headers["x-profile-id"]))
+    assert profile.route == "/slow/{item}"
+    assert profile.status == 200
+    assert any("busy_work" in stack for stack in profile.samples)
+    assert profiler.profiled == 1
+
+
+def test_armed_paths_are_profiled_once(profiled_app):
+    client, profiler = profiled_app
+    profiler.arm("/slow/2")
+
+    assert "x-profile-id" in client.get("/slow/2").headers
+    assert "x-profile-id" not in client.get("/slow/2").headers
+    assert profiler.armed == {}
+
+
+def test_admin_downloads_collapsed_stacks(client: TestClient, admin_token):
+    admin = {"X-Admin-Token": admin_token}
+    token = client.post("/api/v1/admin/profiles/token", headers=admin).json()
+    res = client.get("/status", headers={token["header"]: token["value"]})
+    profile_id = res.headers["x-profile-id"]
+
+    download = client.get(f"/api/v1/admin/profiles/{profile_id}", headers=admin)
+    assert download.status_code == 200
+    for line in download.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack
+    assert client.get("/api/v1/admin/profiles/0", headers=admin).status_code == 404
+    assert client.get(f"/api/v1/admin/profiles/{profile_id}").status_code == 403
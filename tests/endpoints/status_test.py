@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+DIAGNOSTICS = [
+    "/status/hashing",
+    "/status/tokens",
+    "/status/database",
+    "/status/usernames",
+    "/status/users",
+    "/status/social",
+    "/status/outbox",
+    "/status/events",
+    "/status/mail",
+    "/status/tracing",
+    "/status/loop",
+    "/status/logging",
+]
+
+
+@pytest.mark.parametrize("path", DIAGNOSTICS)
+def test_diagnostics_require_the_admin_token(client: TestClient, path, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert (
+        client.get(path, headers={"X-Admin-Token": "admin-secret"}).status_code == 200
+    )
+
+
+def test_health_check_stays_public(client: TestClient):
+    assert client.get("/status").status_code == 200
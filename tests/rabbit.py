@@ -0,0 +1,48 @@
+class FakeBroker:
+    """
+    In-process stand-in for RabbitMQ with the slice of the aio_pika API
+    Rabbit_MQ uses. `nack` makes the next that many publishes fail.
+    """
+
+    def __init__(self) -> None:
+        self.messages = []
+        self.exchanges = {}
+        self.channels = 0
+        self.nack = 0
+        self.closed = False
+
+    async def connect(self, url):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, broker: FakeBroker) -> None:
+        self.broker = broker
+
+    async def channel(self, publisher_confirms=False):
+        self.broker.channels += 1
+        return FakeChannel(self.broker)
+
+    async def close(self):
+        self.broker.closed = True
+
+
+class FakeChannel:
+    def __init__(self, broker: FakeBroker) -> None:
+        self.broker = broker
+
+    async def declare_exchange(self, name, type, durable=False):
+        self.broker.exchanges[name] = (type, durable)
+        return FakeExchange(self.broker, name)
+
+
+class FakeExchange:
+    def __init__(self, broker: FakeBroker, name: str) -> None:
+        self.broker = broker
+        self.name = name
+
+    async def publish(self, message, routing_key, mandatory=True):
+        if self.broker.nack:
+            self.broker.nack -= 1
+            raise RuntimeError("nacked")
+        self.broker.messages.append((self.name, routing_key, message))
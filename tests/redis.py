@@ -0,0 +1,77 @@
+import time
+
+
+class FakeRedis:
+    """
+    Just enough of redis.asyncio.Redis (decode_responses=True) for the tests.
+    Commands are implemented synchronously as `_<command>` so pipelines can
+    queue them, direct calls await the same implementation.
+    """
+
+    def __init__(self) -> None:
+        self.data = {}
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key)
+            return None
+        return value
+
+    def _set(self, key, value, nx=False, ex=None):
+        if nx and self._get(key) is not None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode()
+        self.data[key] = (str(value), time.time() + ex if ex else None)
+        return True
+
+    def _incr(self, key):
+        value = int(self._get(key) or 0) + 1
+        self.data[key] = (str(value), self.data.get(key, (None, None))[1])
+        return value
+
+    def _expire(self, key, seconds):
+        if self._get(key) is None:
+            return False
+        self.data[key] = (self.data[key][0], time.time() + seconds)
+        return True
+
+    def _delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def _mget(self, keys):
+        return [self._get(key) for key in keys]
+
+    def __getattr__(self, name):
+        command = object.__getattribute__(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            return command(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.redis, f"_{name}"), args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
@@ -0,0 +1,40 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.database import db
+from app.database.db import Database
+
+
+def test_non_asyncpg_urls_get_no_asyncpg_options(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(
+        settings, "database_url", f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"
+    )
+    database = Database()
+
+    async def run():
+        async with database.session() as session:
+            value = await session.scalar(text("SELECT 1"))
+        await database.disconnect()
+        return value
+
+    assert asyncio.run(run()) == 1
+
+
+def test_asyncpg_gets_the_statement_cache_size(monkeypatch):
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "database_url", "postgresql+asyncpg://u:p@db/app")
+    monkeypatch.setattr(settings, "db_statement_cache_size", 0)
+    engines = []
+
+    def create_async_engine(url, **options):
+        engines.append(options["connect_args"])
+        return real_create_async_engine(url, **options)
+
+    real_create_async_engine = db.create_async_engine
+    monkeypatch.setattr(db, "create_async_engine", create_async_engine)
+    Database().connect()
+
+    assert engines == [{"prepared_statement_cache_size": 0}]
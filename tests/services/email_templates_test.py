@@ -0,0 +1,39 @@
+import os
+
+import pytest
+from jinja2 import UndefinedError
+
+from app.core.config import settings
+from app.email.templating import TemplateRegistry
+
+
+def test_templates_render_text_and_escaped_html_parts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "email_template_cache_dir", str(tmp_path))
+    registry = TemplateRegistry()
+    registry.load()
+
+    text, html = registry.render("otp", {"otp": "<123456>", "minutes": 5})
+
+    assert "OTP: <123456>" in text
+    assert "&lt;123456&gt;" in html and "<html>" in html
+    # every template was compiled and its bytecode cached at load
+    assert len(list(tmp_path.iterdir())) == len(registry.env.list_templates())
+
+    with pytest.raises(UndefinedError):
+        registry.render("forgot_password", {})
+
+
+def test_debug_mode_reloads_changed_templates(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "debug", True)
+    monkeypatch.setattr(settings, "email_template_bytecode_cache", False)
+    template = tmp_path / "note.txt"
+    template.write_text("first {{ n }}")
+    registry = TemplateRegistry(tmp_path)
+    registry.load()
+    assert registry.render("note", {"n": 1}) == ("first 1", None)
+
+    template.write_text("second {{ n }}")
+    # jinja compares mtimes, make sure the change is visible
+    stat = template.stat()
+    os.utime(template, (stat.st_atime, stat.st_mtime + 5))
+    assert registry.render("note", {"n": 1}) == ("second 1", None)
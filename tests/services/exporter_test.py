@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api.user.exporter import export_users
+from app.database.models.user import User as UserDb
+from tests.database import sqlite_session
+
+START = datetime(2023, 7, 1)
+
+
+def test_export_pages_through_users_in_creation_order():
+    async def run():
+        async with sqlite_session() as (session, statements):
+            # two users share a timestamp to exercise the id tie-breaker
+            created = [
+                START,
+                START,
+                START + timedelta(days=1),
+                START + timedelta(days=2),
+            ]
+            session.add_all(
+                UserDb(
+                    name=f"user {i}",
+                    email=f"user{i}@example.com",
+                    username=f"user{i}",
+                    date_created=date_created,
+                )
+                for i, date_created in enumerate(created)
+            )
+            await session.commit()
+
+            factory = async_sessionmaker(session.bind)
+            statements.clear()
+            chunks = [
+                chunk
+                async for chunk in export_users(page_size=2, session_factory=factory)
+            ]
+            pages = len(statements)
+            since = [
+                chunk
+                async for chunk in export_users(
+                    since=START + timedelta(days=1), session_factory=factory
+                )
+            ]
+            return chunks, pages, since
+
+    chunks, pages, since = asyncio.run(run())
+    rows = [orjson.loads(line) for line in b"".join(chunks).splitlines()]
+
+    assert len(chunks) == 2 and pages == 3
+    assert sorted(row["username"] for row in rows) == [f"user{i}" for i in range(4)]
+    assert [row["date_created"] for row in rows] == sorted(
+        row["date_created"] for row in rows
+    )
+    assert set(rows[0]) == {"user_id", "name", "username", "date_created"}
+    assert [
+        orjson.loads(line)["username"] for line in b"".join(since).splitlines()
+    ] == [
+        "user2",
+        "user3",
+    ]
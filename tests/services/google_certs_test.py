@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+import time
+
+import httpx
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fastapi import FastAPI, Response
+from google.auth import crypt
+from google.auth import jwt as g_jwt
+
+from app.api.user.google_certs import GoogleCertCache
+
+CERTS_URL = "http://google.test/oauth2/v1/certs"
+
+
+def make_signer(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "google.test")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def google_claims():
+    now = int(time.time())
+    return {"sub": "google-user", "email": "a@b.com", "iat": now, "exp": now + 600}
+
+
+def stub_cert_server(certs: dict, max_age: int):
+    stub = FastAPI()
+    stub.state.hits = 0
+
+    @stub.get("/oauth2/v1/certs")
+    async def get_certs(response: Response):
+        stub.state.hits += 1
+        await asyncio.sleep(0.01)
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+        return certs
+
+    return stub
+
+
+def test_concurrent_sign_ins_share_one_cert_fetch():
+    signer, cert = make_signer("key-1")
+    stub = stub_cert_server({"key-1": cert}, max_age=3600)
+    cache = GoogleCertCache(CERTS_URL, transport=httpx.ASGITransport(app=stub))
+    token = g_jwt.encode(signer, google_claims()).decode()
+
+    async def run():
+        results = await asyncio.gather(*(cache.verify(token) for _ in range(10)))
+        await cache.verify(token)
+        await cache.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(result["sub"] == "google-user" for result in results)
+    assert stub.state.hits == 1
+
+
+def test_stale_certs_are_served_while_refreshing():
+    signer, cert = make_signer("key-1")
+    stub = stub_cert_server({"key-1": cert}, max_age=0)
+    cache = GoogleCertCache(CERTS_URL, transport=httpx.ASGITransport(app=stub))
+    token = g_jwt.encode(signer, google_claims()).decode()
+
+    async def run():
+        await cache.verify(token)
+        result = await cache.verify(token)
+        await asyncio.sleep(0.05)
+        await cache.stop()
+        return result
+
+    assert asyncio.run(run())["sub"] == "google-user"
+    assert stub.state.hits == 2
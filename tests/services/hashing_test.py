@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+
+from app.api.user.hashing import (
+    BCRYPT_ROUNDS_RANGE,
+    PasswordHasher,
+    apply_calibration,
+    calibrate,
+    policy_from_settings,
+)
+from app.core.config import settings
+
+
+def test_hash_and_verify_round_trip():
+    hasher = PasswordHasher(workers=1, max_pending=4)
+
+    async def run():
+        hashed = await hasher.hash("password123")
+        return await hasher.verify("password123", hashed)
+
+    assert asyncio.run(run()) is True
+    assert hasher.stats.calls == 2
+
+
+def test_saturated_hasher_fails_fast():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    hasher.pending = 1
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(hasher.hash("password123"))
+
+    assert exc.value.status_code == 503
+    assert hasher.stats.rejected == 1
+
+
+def test_calibration_picks_cost_within_budget_and_flags_stale_hashes():
+    results = calibrate(budget_ms=1, schemes=["bcrypt"])
+    assert results["bcrypt"].params == {"rounds": BCRYPT_ROUNDS_RANGE[0]}
+
+    policy = apply_calibration(policy_from_settings(), results)
+    assert policy["bcrypt__rounds"] == BCRYPT_ROUNDS_RANGE[0]
+
+    stale_hash = bcrypt.using(rounds=BCRYPT_ROUNDS_RANGE[0]).hash("password123")
+    assert PasswordHasher().needs_update(stale_hash) is (
+        settings.bcrypt_rounds != BCRYPT_ROUNDS_RANGE[0]
+    )
@@ -0,0 +1,249 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.user.hashing import pwd_crypt
+from app.api.user import importer as importer_module
+from app.api.user.importer import Checkpoint, UserImporter
+from app.database.db import Base
+from app.database.models.user import User as UserDb
+from tests.database import sqlite_session
+
+PREHASHED = pwd_crypt.hash("legacy-password")
+
+
+def rows():
+    yield {"name": "Ada Lovelace", "email": "ada@example.com", "password": "secret123"}
+    yield {
+        "name": "Alan Turing",
+        "email": "alan@example.com",
+        "hashed_password": PREHASHED,
+    }
+    yield {"name": "Ada Again", "email": "ada@example.com", "password": "secret123"}
+    yield {"name": "No Email", "password": "secret123"}
+    yield {"name": "Bad Hash", "email": "bad@example.com", "hashed_password": "plain"}
+
+
+async def lines(source):
+    for line in source:
+        yield line
+
+
+def test_import_reports_per_batch_and_keeps_prehashed_passwords(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "import.checkpoint")
+    source = [orjson.dumps(row).decode() + "\n" for row in rows()] + ["{broken\n"]
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            importer = UserImporter(
+                batch_size=3,
+                workers=1,
+                checkpoint=checkpoint,
+                session_factory=async_sessionmaker(session.bind),
+            )
+            async with importer:
+                report = await importer.run(lines(source))
+                # a rerun resumes after the last committed line
+                rerun = await importer.run(lines(source))
+            users = (await session.execute(select(UserDb))).scalars().all()
+            return report, rerun, {user.email: user.password for user in users}
+
+    report, rerun, passwords = asyncio.run(run())
+
+    assert (report.imported, report.skipped, report.failed) == (2, 1, 3)
+    assert [len(batch.errors) for batch in report.batches] == [0, 3]
+    assert report.batches[0].skipped == [[3, "email or username already exists"]]
+    assert checkpoint.load() == 6
+    assert rerun.resumed_from == 6 and rerun.batches == []
+
+    assert passwords["alan@example.com"] == PREHASHED
+    assert pwd_crypt.verify("secret123", passwords["ada@example.com"])
+
+
+def test_empty_csv_cells_count_as_missing():
+    source = [
+        "name,email,password,hashed_password,username\n",
+        "Grace Hopper,grace@example.com,,%s,\n" % PREHASHED,
+        "Edsger Dijkstra,edsger@example.com,secret123,,\n",
+    ]
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            importer = UserImporter(
+                workers=1, session_factory=async_sessionmaker(session.bind)
+            )
+            async with importer:
+                report = await importer.run(lines(source), format="csv")
+            users = (await session.execute(select(UserDb))).scalars().all()
+            return report, {user.email: user for user in users}
+
+    report, users = asyncio.run(run())
+
+    assert (report.imported, report.failed) == (2, 0)
+    assert users["grace@example.com"].password == PREHASHED
+    assert all(len(user.username) >= 3 for user in users.values())
+
+
+class FakeHasher:
+    """A shared password hasher that records how many chunks are in flight"""
+
+    def __init__(self, workers: int, busy: int = 0) -> None:
+        self.workers = workers
+        self.busy = busy
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def hash_many(self, passwords: list) -> list:
+        if self.busy:
+            self.busy -= 1
+            raise HTTPException(status_code=503)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return [pwd_crypt.hash(password) for password in passwords]
+
+
+def test_shared_hasher_gets_a_few_chunks_at_a_time(monkeypatch):
+    monkeypatch.setattr(importer_module, "HASH_CHUNK", 1)
+    monkeypatch.setattr(importer_module, "HASHER_BUSY_WAIT", 0)
+    source = [
+        orjson.dumps(
+            {
+                "name": f"User {i}",
+                "email": f"user{i}@example.com",
+                "password": "secret123",
+            }
+        ).decode()
+        + "\n"
+        for i in range(12)
+    ]
+    hasher = FakeHasher(workers=4, busy=2)
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            importer = UserImporter(
+                workers=4,
+                hasher=hasher,
+                session_factory=async_sessionmaker(session.bind),
+            )
+            async with importer:
+                return await importer.run(lines(source))
+
+    report = asyncio.run(run())
+
+    # rejected chunks are resubmitted, never more than half the pool is used
+    assert (report.imported, report.failed) == (12, 0)
+    assert hasher.max_in_flight == 2
+
+
+class FakeAsyncpg:
+    """
+    The part of asyncpg the COPY path uses. Like the asyncpg adapter, a
+    transaction is only begun by a statement run through the session, and
+    outside one a COPY into the ON COMMIT DELETE ROWS table is lost.
+    """
+
+    def __init__(self) -> None:
+        self.in_transaction = False
+        self.temp_rows = []
+        self.users = []
+
+    async def execute(self, query):
+        pass  # autocommits, begins nothing
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.in_transaction:
+            self.temp_rows += [dict(zip(columns, record)) for record in records]
+
+
+class FakePostgresSession:
+    bind = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def __init__(self, driver: FakeAsyncpg) -> None:
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.driver.in_transaction = False
+
+    async def execute(self, statement):
+        self.driver.in_transaction = True
+        inserted = []
+        if str(statement).startswith("INSERT INTO users"):
+            taken = {user["email"] for user in self.driver.users}
+            for row in self.driver.temp_rows:
+                if row["email"] not in taken:
+                    taken.add(row["email"])
+                    inserted.append(row["id"])
+                    self.driver.users.append(row)
+        return SimpleNamespace(scalars=lambda: inserted)
+
+    async def connection(self):
+        return self
+
+    async def get_raw_connection(self):
+        return SimpleNamespace(driver_connection=self.driver)
+
+    async def commit(self):
+        self.driver.in_transaction = False
+        self.driver.temp_rows = []
+
+
+def test_postgres_copy_runs_inside_the_transaction():
+    driver = FakeAsyncpg()
+    source = [orjson.dumps(row).decode() + "\n" for row in rows()]
+
+    async def run():
+        importer = UserImporter(
+            workers=1, session_factory=lambda: FakePostgresSession(driver)
+        )
+        async with importer:
+            return await importer.run(lines(source))
+
+    report = asyncio.run(run())
+
+    assert (report.imported, report.skipped) == (2, 1)
+    assert {user["email"] for user in driver.users} == {
+        "ada@example.com",
+        "alan@example.com",
+    }
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_POSTGRES_URL"), reason="needs TEST_POSTGRES_URL"
+)
+def test_postgres_import_lands_rows():
+    source = [orjson.dumps(row).decode() + "\n" for row in rows()]
+
+    async def run():
+        engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        try:
+            importer = UserImporter(
+                workers=1, session_factory=async_sessionmaker(engine)
+            )
+            async with importer:
+                report = await importer.run(lines(source))
+            async with async_sessionmaker(engine)() as session:
+                emails = (await session.execute(select(UserDb.email))).scalars()
+                return report, set(emails)
+        finally:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.drop_all)
+            await engine.dispose()
+
+    report, emails = asyncio.run(run())
+
+    assert (report.imported, report.skipped) == (2, 1)
+    assert emails == {"ada@example.com", "alan@example.com"}
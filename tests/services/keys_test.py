@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from jose import JWTError, jwt
+
+from app.api.user.keys import KeyRing
+from app.core.config import settings
+
+
+def test_workers_generating_a_dev_key_at_once_share_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "debug", True)
+    rings = [KeyRing(tmp_path) for _ in range(8)]
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(KeyRing.load, rings))
+
+    assert [path.name for path in tmp_path.iterdir()] == ["dev.pem"]
+    token = rings[0].sign({"sub": "user-id"})
+    assert all(ring.verify(token)["sub"] == "user-id" for ring in rings)
+
+
+def test_legacy_hs256_tokens_need_an_explicit_cutoff(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "debug", True)
+    token = jwt.encode({"sub": "user-id"}, settings.secret_key, algorithm="HS256")
+    ring = KeyRing(tmp_path)
+    ring.load()
+    assert ring.verify(token)["sub"] == "user-id"
+
+    # outside debug only until the configured cutoff
+    monkeypatch.setattr(settings, "debug", False)
+    with pytest.raises(JWTError):
+        ring.verify(token)
+    monkeypatch.setattr(
+        settings, "jwt_legacy_hs256_until", datetime.utcnow() + timedelta(days=1)
+    )
+    assert ring.verify(token)["sub"] == "user-id"
+    monkeypatch.setattr(
+        settings, "jwt_legacy_hs256_until", datetime.utcnow() - timedelta(seconds=1)
+    )
+    with pytest.raises(JWTError):
+        ring.verify(token)
+
+
+def test_unhashable_kid_is_an_invalid_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "debug", True)
+    ring = KeyRing(tmp_path)
+    token = ring.sign({"sub": "user-id"})
+    crafted = jwt.encode(
+        {"sub": "user-id"}, "x", algorithm="HS384", headers={"kid": ["x"]}
+    )
+
+    with pytest.raises(JWTError):
+        ring.verify(crafted)
+    assert ring.verify(token)["sub"] == "user-id"
@@ -0,0 +1,96 @@
+import logging
+import queue
+from logging.handlers import QueueListener
+
+import orjson
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.logger import (
+    JSONFormatter,
+    LogContextMiddleware,
+    RequestQueueHandler,
+    SamplingFilter,
+    bind_user,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.setFormatter(JSONFormatter())
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(orjson.loads(self.format(record)))
+
+
+@pytest.fixture
+def pipeline():
+    """A logger wired like app.core.logger, writing to a list once started"""
+    log_queue = queue.Queue(maxsize=100)
+    handler = RequestQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    output = ListHandler()
+    listener = QueueListener(log_queue, output)
+    test_logger = logging.getLogger("logging-test")
+    test_logger.handlers = [handler]
+    test_logger.setLevel(logging.DEBUG)
+    test_logger.propagate = False
+    return test_logger, handler, output, listener
+
+
+def test_lines_carry_the_request_context(pipeline):
+    test_logger, _, output, listener = pipeline
+    listener.start()
+    app = FastAPI()
+    app.add_middleware(LogContextMiddleware)
+
+    def current_user():
+        bind_user("user-1")
+
+    @app.get("/items/{item}", dependencies=[Depends(current_user)])
+    async def item(item: str):
+        test_logger.info("fetching %s", item)
+        return {}
+
+    res = TestClient(app).get("/items/7", headers={"X-Request-ID": "req-1"})
+    test_logger.info("outside a request")
+    listener.stop()
+
+    assert res.headers["x-request-id"] == "req-1"
+    inside, outside = output.lines
+    assert inside["message"] == "fetching 7"
+    assert inside["route"] == "/items/{item}"
+    assert (inside["request_id"], inside["user_id"]) == ("req-1", "user-1")
+    assert "request_id" not in outside
+
+
+def test_noisy_call_sites_are_sampled(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "log_site_rate", 3)
+    test_logger, _, output, listener = pipeline
+    listener.start()
+
+    for i in range(10):
+        test_logger.debug(f"noisy {i}")
+        test_logger.warning(f"important {i}")
+    listener.stop()
+
+    messages = [line["message"] for line in output.lines]
+    assert [m for m in messages if m.startswith("noisy")] == [
+        "noisy 0",
+        "noisy 1",
+        "noisy 2",
+    ]
+    assert len([m for m in messages if m.startswith("important")]) == 10
+
+
+def test_full_queue_drops_instead_of_blocking(pipeline):
+    test_logger, handler, _, _ = pipeline
+
+    for i in range(150):
+        test_logger.error(f"line {i}")
+
+    assert handler.dropped == 50
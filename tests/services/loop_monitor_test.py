@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.loop_monitor import LoopBlocked, LoopMonitor
+
+
+@pytest.fixture(autouse=True)
+def fast_monitor(monkeypatch):
+    monkeypatch.setattr(settings, "loop_monitor_interval_ms", 10)
+    monkeypatch.setattr(settings, "loop_stall_threshold_ms", 50)
+    monkeypatch.setattr(settings, "loop_block_fail_ms", 100)
+
+
+def blocking_handler():
+    time.sleep(0.2)
+
+
+def run_with_monitor(monitor: LoopMonitor, handler):
+    async def run():
+        await monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            await handler()
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(run())
+
+
+def test_blocking_call_is_caught_with_its_stack():
+    monitor = LoopMonitor()
+
+    async def handler():
+        blocking_handler()
+
+    run_with_monitor(monitor, handler)
+
+    stats = monitor.stats()
+    assert stats["lag_ms_max"] >= 150
+    (stall,) = stats["stalls"]
+    assert "blocking_handler" in stall["stack"]
+    with pytest.raises(LoopBlocked, match="blocked for"):
+        monitor.check()
+    monitor.check()  # each stall fails only once
+
+
+def test_offloaded_work_does_not_block():
+    monitor = LoopMonitor()
+
+    async def handler():
+        await asyncio.to_thread(blocking_handler)
+
+    run_with_monitor(monitor, handler)
+
+    assert monitor.stats()["stalls"] == []
+    assert monitor.stats()["lag_ms_p99"] < 50
+    monitor.check()
@@ -0,0 +1,138 @@
+import asyncio
+import smtplib
+
+import pytest
+
+from app.core.config import settings
+from app.email import dispatcher as dispatcher_module
+from app.email.dispatcher import MailDispatcher
+from app.email.mail import GmailSender
+
+
+class FakeSMTP:
+    """Records messages per session, `drop_after` sends kill the session"""
+
+    sessions = []
+
+    def __init__(self, drop_after: int = None) -> None:
+        self.messages = []
+        self.drop_after = drop_after
+        FakeSMTP.sessions.append(self)
+
+    def noop(self):
+        return 250, b"OK"
+
+    def send_message(self, message):
+        if self.drop_after is not None and len(self.messages) == self.drop_after:
+            raise smtplib.SMTPServerDisconnected("gone")
+        if message["to"] == "refused@example.com":
+            raise smtplib.SMTPRecipientsRefused({message["to"]: (550, b"no")})
+        self.messages.append(message["to"])
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fast_mail(monkeypatch):
+    FakeSMTP.sessions = []
+    monkeypatch.setattr(settings, "mail_connections", 1)
+    monkeypatch.setattr(settings, "mail_batch_size", 10)
+    monkeypatch.setattr(settings, "mail_backoff", 0)
+
+
+def message(to):
+    return GmailSender.build_message(subject="OTP", message="1234", recipient_list=to)
+
+
+def test_queue_reuses_sessions_retries_and_drains_on_stop():
+    # the first session drops after 3 messages, its replacement is healthy
+    connects = iter([FakeSMTP(drop_after=3), FakeSMTP()])
+    dispatcher = MailDispatcher(connect=lambda: next(connects))
+
+    async def run():
+        await dispatcher.start()
+        for i in range(12):
+            await dispatcher.send(message(f"user{i}@example.com"))
+        await dispatcher.send(message("refused@example.com"))
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+    first, second = FakeSMTP.sessions
+    assert len(first.messages) == 3
+    assert sorted(first.messages + second.messages) == sorted(
+        f"user{i}@example.com" for i in range(12)
+    )
+    stats = dispatcher.stats()
+    assert (stats["sent"], stats["failed"], stats["retried"]) == (12, 1, 7)
+
+
+def test_full_queue_drops_unless_waiting(monkeypatch):
+    monkeypatch.setattr(settings, "mail_queue_size", 1)
+    dispatcher = MailDispatcher(connect=FakeSMTP)
+
+    async def run():
+        await dispatcher.start()
+        queued = [
+            await dispatcher.send(message("a@b.com"), wait=False) for _ in range(2)
+        ]
+        await dispatcher.stop()
+        return queued
+
+    assert asyncio.run(run()) == [True, False]
+    assert dispatcher.stats()["dropped"] == 1
+
+
+def test_send_before_start_goes_out_directly():
+    dispatcher = MailDispatcher(connect=FakeSMTP)
+
+    asyncio.run(dispatcher.send(message("a@b.com")))
+
+    assert FakeSMTP.sessions[0].messages == ["a@b.com"]
+
+
+def test_failed_login_closes_the_connection(monkeypatch):
+    class RejectingSMTP(FakeSMTP):
+        closed = False
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__()
+
+        def login(self, user, password):
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(settings, "mail_backend", "smtp")
+    monkeypatch.setattr(settings, "smtp_ssl", True)
+    monkeypatch.setattr(settings, "email_password", "wrong")
+    monkeypatch.setattr(dispatcher_module.smtplib, "SMTP_SSL", RejectingSMTP)
+
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        dispatcher_module.smtp_connect()
+
+    assert FakeSMTP.sessions[0].closed
+
+
+def test_rejected_login_fails_the_batch_without_retries():
+    logins = []
+
+    def connect():
+        logins.append(1)
+        raise smtplib.SMTPAuthenticationError(454, b"try again later")
+
+    dispatcher = MailDispatcher(connect=connect)
+
+    async def run():
+        await dispatcher.start()
+        for i in range(5):
+            await dispatcher.send(message(f"user{i}@example.com"))
+        await dispatcher.stop()
+
+    asyncio.run(run())
+
+    assert len(logins) == 1
+    stats = dispatcher.stats()
+    assert (stats["sent"], stats["failed"], stats["retried"]) == (0, 5, 0)
@@ -0,0 +1,38 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.api.user.otp import OTPGenerator
+from app.api.user.otp_store import MemoryOTPStore, RedisOTPStore
+from tests.redis import FakeRedis
+
+
+@pytest.mark.parametrize(
+    "store_factory", [MemoryOTPStore, lambda: RedisOTPStore(FakeRedis())]
+)
+def test_ttl_stores_issue_and_verify_otps(store_factory):
+    store = store_factory()
+    otp_gen = OTPGenerator(user_id=uuid4(), session=None, store=store)
+
+    async def run():
+        first = await otp_gen.get_otp()
+        second = await otp_gen.get_otp()
+        return (
+            await otp_gen.check_otp(otp=first),
+            await otp_gen.check_otp(otp=second),
+        )
+
+    assert asyncio.run(run()) == (("invalid", False), ("passed", True))
+
+
+def test_redis_store_reports_expired_otps():
+    redis = FakeRedis()
+    otp_gen = OTPGenerator(user_id=uuid4(), session=None, store=RedisOTPStore(redis))
+
+    async def run():
+        otp = await otp_gen.get_otp()
+        redis.data.pop(f"otp:{otp_gen.user_id}:issued")
+        return await otp_gen.check_otp(otp=otp)
+
+    assert asyncio.run(run()) == ("expired", False)
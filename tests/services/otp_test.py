@@ -0,0 +1,31 @@
+import asyncio
+from uuid import uuid4
+
+from app.api.user.otp import OTPGenerator
+from tests.database import sqlite_session
+
+
+def test_issue_and_verify_otp_with_single_statements():
+    user_id = uuid4()
+
+    async def run():
+        async with sqlite_session() as (session, statements):
+            otp_gen = OTPGenerator(user_id=user_id, session=session)
+            await otp_gen.get_otp()
+            otp = await otp_gen.get_otp()
+            issue_statements = len(statements)
+
+            statements.clear()
+            result = await otp_gen.check_otp(otp=otp)
+            return issue_statements, len(statements), result
+
+    assert asyncio.run(run()) == (2, 1, ("passed", True))
+
+
+def test_unknown_user_otp_is_invalid():
+    async def run():
+        async with sqlite_session() as (session, _):
+            otp_gen = OTPGenerator(user_id=uuid4(), session=session)
+            return await otp_gen.check_otp(otp="123456")
+
+    assert asyncio.run(run()) == ("invalid", False)
@@ -0,0 +1,196 @@
+import asyncio
+import os
+from uuid import uuid4
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.api.user.outbox import USERNAME_UPDATED, OutboxDispatcher, add_event
+from app.api.user.schemas import User
+from app.api.user.services import UserService
+from app.api.user.social import SocialClient
+from app.core.config import settings
+from app.database.models.outbox import OutboxEvent
+from tests.database import sqlite_session
+
+
+def stub_social_service(status_code: int):
+    stub = FastAPI()
+    stub.state.calls = []
+    stub.state.status_code = status_code
+
+    @stub.post("/api/{endpoint:path}")
+    async def endpoint(endpoint: str, request: Request):
+        stub.state.calls.append((endpoint, await request.json()))
+        return Response(status_code=stub.state.status_code)
+
+    return stub
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    monkeypatch.setattr(settings, "social_retries", 0)
+
+
+def test_events_are_delivered_in_order_and_username_changes_coalesced():
+    stub = stub_social_service(status_code=503)
+    client = SocialClient("http://social.test/", httpx.ASGITransport(app=stub))
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            service = UserService(session=session)
+            created = await service.create_user(
+                User(
+                    name="Ada Lovelace",
+                    username="ada",
+                    email="ada@example.com",
+                    password="password123",
+                )
+            )
+            user_id = str(created["user_id"])
+            await service.update_username(user_id, "countess")
+            await service.update_username(user_id, "lovelace")
+
+            dispatcher = OutboxDispatcher(
+                client=client, session_factory=async_sessionmaker(session.bind)
+            )
+            # the profile call fails, nothing after it may go out
+            assert await dispatcher.drain() == 3
+            held = (await session.execute(select(OutboxEvent))).scalars().all()
+            assert [event.attempts for event in held] == [1, 1, 1]
+            assert await dispatcher.drain() == 0
+
+            stub.state.status_code = 200
+            await session.execute(
+                OutboxEvent.__table__.update().values(available_at=held[0].date_created)
+            )
+            await session.commit()
+            assert await dispatcher.drain() == 3
+            remaining = (await session.execute(select(OutboxEvent))).scalars().all()
+            return user_id, dispatcher.stats(), remaining
+
+    user_id, stats, remaining = asyncio.run(run())
+
+    assert remaining == []
+    profile = {
+        "user_id": user_id,
+        "username": "ada",
+        "name": "Ada Lovelace",
+        "picture": "None",
+    }
+    assert stub.state.calls == [
+        ("create/profile", profile),
+        ("create/profile", profile),
+        ("update/username", {"user_id": user_id, "username": "lovelace"}),
+    ]
+    assert (stats["delivered"], stats["coalesced"], stats["failures"]) == (2, 1, 1)
+
+
+def test_no_session_is_open_while_delivering_and_claims_are_leased():
+    stub = stub_social_service(status_code=200)
+    client = SocialClient("http://social.test/", httpx.ASGITransport(app=stub))
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            await UserService(session=session).create_user(
+                User(
+                    name="Ada Lovelace",
+                    username="ada",
+                    email="ada@example.com",
+                    password="password123",
+                )
+            )
+            sessions = async_sessionmaker(session.bind)
+            open_sessions = []
+
+            class CountingSession:
+                async def __aenter__(self):
+                    open_sessions.append(self)
+                    self.session = sessions()
+                    return await self.session.__aenter__()
+
+                async def __aexit__(self, *args):
+                    open_sessions.remove(self)
+                    return await self.session.__aexit__(*args)
+
+            dispatcher = OutboxDispatcher(
+                client=client, session_factory=CountingSession
+            )
+            seen = []
+
+            @stub.middleware("http")
+            async def record(request, call_next):
+                # draining again mid-delivery finds the batch leased
+                seen.append((len(open_sessions), await dispatcher.drain()))
+                return await call_next(request)
+
+            assert await dispatcher.drain() == 1
+            return seen
+
+    assert asyncio.run(run()) == [(0, 0)]
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_POSTGRES_URL"), reason="needs TEST_POSTGRES_URL"
+)
+def test_overlapping_claims_do_not_split_a_users_events(monkeypatch):
+    monkeypatch.setattr(settings, "outbox_batch_size", 1)
+    user_id = uuid4()
+
+    async def run():
+        engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+        async with engine.begin() as connection:
+            await connection.run_sync(OutboxEvent.__table__.drop, checkfirst=True)
+            await connection.run_sync(OutboxEvent.__table__.create)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with sessions() as session:
+                for username in ("countess", "lovelace"):
+                    await add_event(
+                        session, user_id, USERNAME_UPDATED, {"username": username}
+                    )
+                await session.commit()
+
+            claimed, release = asyncio.Event(), asyncio.Event()
+
+            class PausedSession:
+                """Holds the first claim open right before it commits"""
+
+                async def __aenter__(self):
+                    self.session = await sessions().__aenter__()
+                    commit = self.session.commit
+
+                    async def paused_commit():
+                        claimed.set()
+                        await release.wait()
+                        await commit()
+
+                    self.session.commit = paused_commit
+                    return self.session
+
+                async def __aexit__(self, *args):
+                    return await self.session.__aexit__(*args)
+
+            first = OutboxDispatcher(session_factory=PausedSession)
+            second = OutboxDispatcher(session_factory=sessions)
+            first_claim = asyncio.create_task(first._claim())
+            await claimed.wait()
+            second_claim = asyncio.create_task(second._claim())
+            await asyncio.sleep(0.2)
+            waited = not second_claim.done()
+            release.set()
+            return waited, await first_claim, await second_claim
+        finally:
+            async with engine.begin() as connection:
+                await connection.run_sync(OutboxEvent.__table__.drop)
+            await engine.dispose()
+
+    waited, first, second = asyncio.run(run())
+
+    # the second claim sees the first one's lease, not the user's newer event
+    assert waited
+    assert [event.payload["username"] for event in first] == ["countess"]
+    assert second == []
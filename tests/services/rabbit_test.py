@@ -0,0 +1,84 @@
+import asyncio
+
+import orjson
+from aio_pika import DeliveryMode
+
+from app.core.config import settings
+from app.utils.pika_rabbit import Rabbit_MQ
+from tests.rabbit import FakeBroker
+
+
+def test_events_are_confirmed_in_batches_and_nacks_republished(monkeypatch):
+    monkeypatch.setattr(settings, "rabbitmq_channels", 1)
+    monkeypatch.setattr(settings, "rabbitmq_confirm_batch", 10)
+    monkeypatch.setattr(settings, "rabbitmq_backoff", 0.001)
+    broker = FakeBroker()
+    broker.nack = 2
+    publisher = Rabbit_MQ(connect=broker.connect)
+
+    async def run():
+        await publisher.connect_broker()
+        for i in range(25):
+            await publisher.publish_message("username.updated", {"n": i})
+        await publisher.close()
+
+    asyncio.run(run())
+
+    assert broker.closed and broker.exchanges == {"user.events": ("topic", True)}
+    numbers = sorted(
+        orjson.loads(message.body)["n"] for _, _, message in broker.messages
+    )
+    assert numbers == list(range(25))
+    assert all(
+        message.delivery_mode == DeliveryMode.PERSISTENT
+        for _, _, message in broker.messages
+    )
+    stats = publisher.stats()
+    assert (stats["confirmed"], stats["nacked"], stats["dropped"]) == (25, 2, 0)
+    assert stats["batches"] == 3
+
+
+def test_failing_broker_backs_off_and_dead_letters(monkeypatch):
+    monkeypatch.setattr(settings, "rabbitmq_channels", 1)
+    monkeypatch.setattr(settings, "rabbitmq_publish_retries", 3)
+    monkeypatch.setattr(settings, "rabbitmq_backoff", 0.01)
+    broker = FakeBroker()
+    broker.nack = 1000
+    publisher = Rabbit_MQ(connect=broker.connect)
+
+    async def run():
+        await publisher.connect_broker()
+        await publisher.publish_message("username.updated", {"n": 1})
+        await asyncio.sleep(0.2)
+        stats = publisher.stats()
+        await publisher.close()
+        return stats
+
+    stats = asyncio.run(run())
+
+    # three attempts with growing pauses between them, not a hot loop
+    assert (stats["batches"], stats["nacked"], stats["dead_lettered"]) == (3, 3, 1)
+    assert stats["buffered"] == 0 and broker.messages == []
+
+
+def test_full_buffer_drops_or_applies_backpressure(monkeypatch):
+    monkeypatch.setattr(settings, "rabbitmq_buffer_size", 2)
+    publisher = Rabbit_MQ(connect=FakeBroker().connect)
+
+    async def run():
+        await publisher.connect_broker()
+        # nothing is flushed until this coroutine yields
+        queued = [await publisher.publish_message("e", {}) for _ in range(3)]
+        waited = await publisher.publish_message("e", {}, wait=True)
+        await publisher.close()
+        return queued, waited
+
+    queued, waited = asyncio.run(run())
+
+    assert queued == [True, True, False] and waited
+    stats = publisher.stats()
+    assert (stats["dropped"], stats["backpressure_waits"]) == (1, 1)
+
+
+def test_publishing_without_a_broker_is_a_no_op():
+    assert asyncio.run(Rabbit_MQ().publish_message("e", {})) is False
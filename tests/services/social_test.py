@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+
+from app.api.user.social import SocialClient
+from app.core.config import settings
+
+
+def stub_social_service(failures: int):
+    """Answers 503 to the first `failures` calls of each endpoint"""
+    stub = FastAPI()
+    stub.state.calls = []
+
+    @stub.post("/api/{endpoint:path}")
+    async def endpoint(endpoint: str, request: Request):
+        stub.state.calls.append((endpoint, await request.json()))
+        attempts = sum(call[0] == endpoint for call in stub.state.calls)
+        return Response(status_code=503 if attempts <= failures else 200)
+
+    return stub
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "social_backoff", 0)
+
+
+def test_idempotent_calls_are_retried_and_others_are_not():
+    stub = stub_social_service(failures=2)
+    client = SocialClient("http://social.test/", httpx.ASGITransport(app=stub))
+
+    async def run():
+        await client.start()
+        try:
+            renamed = await client.update_username(user_id="1", username="ada")
+            created = await client.create_profile({"user_id": "1", "name": "Ada"})
+        finally:
+            await client.stop()
+        return renamed, created
+
+    renamed, created = asyncio.run(run())
+
+    assert renamed.status_code == 200
+    assert created.status_code == 503
+    assert [call[0] for call in stub.state.calls] == ["update/username"] * 3 + [
+        "create/profile"
+    ]
+    stats = client.stats()
+    assert stats["api/update/username"]["retries"] == 2
+    assert stats["api/update/username"]["calls"] == 3
+    assert stats["api/create/profile"]["retries"] == 0
+
+
+def test_unreachable_service_fails_after_retries(monkeypatch):
+    monkeypatch.setattr(settings, "social_retries", 2)
+
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client = SocialClient("http://social.test/", httpx.MockTransport(refuse))
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.create_profile({"user_id": "1"}))
+
+    assert client.stats()["api/create/profile"]["errors"] == 3
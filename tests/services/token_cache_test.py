@@ -0,0 +1,33 @@
+import time
+
+from app.api.user.token_cache import ClaimCache
+
+
+def test_cached_claims_skip_decoding_until_exp():
+    cache = ClaimCache(maxsize=8, max_ttl=300)
+    calls = []
+
+    def decoder(token):
+        calls.append(token)
+        return {"sub": "user", "exp": time.time() + 60}
+
+    for _ in range(3):
+        assert cache.get_or_decode("token", decoder)["sub"] == "user"
+
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_never_outlive_token_exp():
+    cache = ClaimCache(maxsize=8, max_ttl=300)
+    calls = []
+
+    def decoder(token):
+        calls.append(token)
+        return {"sub": "user", "exp": time.time() - 1}
+
+    cache.get_or_decode("token", decoder)
+    cache.get_or_decode("token", decoder)
+
+    assert len(calls) == 2
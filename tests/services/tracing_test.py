@@ -0,0 +1,103 @@
+import time
+
+import pytest
+import sentry_sdk
+from sentry_sdk.transport import Transport
+
+from app.core.config import settings
+from app.core.tracing import TraceSampler
+
+
+@pytest.fixture
+def sampler(monkeypatch):
+    monkeypatch.setattr(settings, "sentry_traces_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "sentry_traces_per_second", 3)
+    monkeypatch.setattr(settings, "sentry_slow_request_ms", 50)
+    monkeypatch.setattr(settings, "sentry_low_value_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "sentry_tail_sampled_routes", ["/login"])
+    # every request lands in the same rate limit window
+    return TraceSampler(clock=lambda: 1.0)
+
+
+class RecordingTransport(Transport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.transactions = []
+
+    def capture_envelope(self, envelope):
+        self.transactions.append(envelope.get_transaction_event()["transaction"])
+
+
+def send_transactions(sampler: TraceSampler, requests: list) -> list:
+    """Runs (path, seconds, status) requests through a real Sentry client"""
+    return record_transactions(sampler, requests)[0]
+
+
+def record_transactions(sampler: TraceSampler, requests: list) -> tuple:
+    """Also returns which requests were recorded at all"""
+    transport = RecordingTransport()
+    hub = sentry_sdk.Hub(
+        sentry_sdk.Client(
+            dsn="http://key@sentry.test/1",
+            transport=transport,
+            traces_sampler=sampler.traces_sampler,
+            before_send_transaction=sampler.before_send_transaction,
+        )
+    )
+    recorded = []
+    for path, seconds, status in requests:
+        transaction = hub.start_transaction(
+            name=path,
+            op="http.server",
+            custom_sampling_context={"asgi_scope": {"path": path}},
+        )
+        recorded.append(transaction.sampled)
+        time.sleep(seconds)
+        transaction.set_status(status)
+        transaction.finish(hub)
+    return transport.transactions, recorded
+
+
+def test_low_value_routes_are_dropped_before_recording(sampler):
+    sent = send_transactions(sampler, [("/status/mail", 0, "ok"), ("/login", 0, "ok")])
+
+    assert sent == ["/login"]
+    assert sampler.stats()["low_value_dropped"] == 1
+
+
+def test_ordinary_requests_are_rate_limited_before_recording(sampler):
+    sent, recorded = record_transactions(sampler, [("/feed", 0, "ok")] * 5)
+
+    assert sent == ["/feed"] * 3
+    assert recorded == [True] * 3 + [False] * 2
+    stats = sampler.stats()
+    assert (stats["sampled"], stats["rate_limited"]) == (3, 2)
+
+
+def test_tail_sampled_routes_keep_errors_and_slow_requests(sampler):
+    fast = [("/login", 0, "ok")] * 5
+    sent, recorded = record_transactions(
+        sampler, fast + [("/login", 0.06, "ok"), ("/login", 0, "internal_error")]
+    )
+
+    assert sent == ["/login"] * 5 and all(recorded)
+    stats = sampler.stats()
+    assert stats["rate_limited"] == 2
+    assert stats["slow"] == stats["error"] == 1
+    assert (stats["kept"], stats["dropped"]) == (5, 2)
+
+
+def test_sample_rate_applies_to_ordinary_requests(sampler, monkeypatch):
+    monkeypatch.setattr(settings, "sentry_traces_sample_rate", 0.0)
+    sent = send_transactions(
+        sampler,
+        [
+            ("/feed", 0, "unknown_error"),
+            ("/login", 0, "ok"),
+            ("/login", 0, "unknown_error"),
+        ],
+    )
+
+    # only tail sampled routes can still keep an error
+    assert sent == ["/login"]
+    assert sampler.stats()["sampled_out"] == 2
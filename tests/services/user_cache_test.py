@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+from app.api.user import services
+from app.api.user.schemas import User
+from app.api.user.services import UserService
+from app.api.user.user_cache import CachedUser, UserCache
+from app.core.config import settings
+from tests.database import sqlite_session
+from tests.redis import FakeRedis
+
+
+def test_lookups_are_served_from_cache_until_a_write_invalidates(monkeypatch):
+    redis = FakeRedis()
+    worker, other_worker = UserCache(redis), UserCache(redis)
+
+    async def run():
+        async with sqlite_session() as (session, statements):
+            user_service = UserService(session=session)
+            created = await user_service.create_user(
+                User(
+                    name="Ada Lovelace",
+                    username="ada",
+                    email="ada@example.com",
+                    password="password123",
+                )
+            )
+            user_id = str(created["user_id"])
+
+            monkeypatch.setattr(services, "user_cache", worker)
+            statements.clear()
+            by_email = await user_service.find_by_email("ada@example.com")
+            by_id = await user_service.find_by_id(user_id)
+            assert by_email == by_id and by_id.username == "ada"
+            assert len(statements) == 1  # the id key was filled by the email miss
+
+            monkeypatch.setattr(services, "user_cache", other_worker)
+            assert await user_service.find_by_id(user_id) == by_id
+            assert len(statements) == 1  # served from Redis
+
+            await user_service.update_username(user_id, "countess")
+            statements.clear()
+            renamed = await user_service.find_by_email("ada@example.com")
+            assert renamed.username == "countess" and len(statements) == 1
+
+    asyncio.run(run())
+
+    assert worker.stats()["local_hits"] == 1
+    assert other_worker.stats()["remote_hits"] == 1
+    assert other_worker.stats()["invalidations"] == 1
+
+
+class DownRedis:
+    """A cache Redis that is not running"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        raise ConnectionError("Connection refused")
+
+    async def delete(self, *keys):
+        self.calls += 1
+        raise ConnectionError("Connection refused")
+
+
+def test_a_down_redis_is_skipped_for_a_while(monkeypatch):
+    monkeypatch.setattr(settings, "user_cache_redis_backoff", 30.0)
+    redis = DownRedis()
+    cache = UserCache(redis)
+    user = CachedUser(uuid4(), "Ada", "ada@example.com", "ada", datetime.utcnow())
+
+    async def load():
+        return user
+
+    async def run():
+        for email in ("a@example.com", "b@example.com", "c@example.com"):
+            assert await cache.get("email", email, load) == user
+        # invalidations are still attempted
+        await cache.invalidate(user.id, user.email)
+
+    asyncio.run(run())
+
+    assert redis.calls == 2
+    assert cache.stats()["remote_errors"] == 2
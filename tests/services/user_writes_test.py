@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.user.schemas import User
+from app.api.user.services import UserService
+from app.api.user.username_index import BloomFilter, username_index
+from tests.database import sqlite_session
+
+
+def new_user(**kwargs):
+    data = {
+        "name": "Ada Lovelace",
+        "username": "ada",
+        "email": "ada@example.com",
+        "password": "password123",
+    }
+    return User(**{**data, **kwargs})
+
+
+def test_signup_and_username_change_take_one_write_plus_outbox_each():
+    async def run():
+        async with sqlite_session() as (session, statements):
+            result = await UserService(session=session).create_user(new_user())
+            signup_statements = len(statements)
+
+            statements.clear()
+            await UserService(session=session).update_username(
+                user_id=str(result["user_id"]), username="countess"
+            )
+            return signup_statements, len(statements)
+
+    # the user write and its outbox event, in one transaction
+    assert asyncio.run(run()) == (2, 2)
+
+
+@pytest.mark.parametrize(
+    "duplicate, detail",
+    [
+        ({"username": "other"}, "email already exist, please try a new one"),
+        ({"email": "other@example.com"}, "Username is already taken"),
+    ],
+)
+def test_signup_conflicts_map_to_400(duplicate, detail):
+    async def run():
+        async with sqlite_session() as (session, _):
+            service = UserService(session=session)
+            await service.create_user(new_user())
+            await service.create_user(new_user(**duplicate))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(run())
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail == detail
+
+
+def test_username_change_conflict_maps_to_400():
+    async def run():
+        async with sqlite_session() as (session, _):
+            service = UserService(session=session)
+            await service.create_user(new_user())
+            other = await service.create_user(
+                new_user(username="grace", email="grace@example.com")
+            )
+            await service.update_username(user_id=str(other["user_id"]), username="ada")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(run())
+
+    assert exc.value.detail == "Username already taken"
+
+
+def test_suggestions_and_generated_usernames_are_checked_in_the_database(
+    monkeypatch,
+):
+    taken = ["ada10", "ada11", "ada12"]
+    monkeypatch.setattr(username_index, "filter", None)
+    monkeypatch.setattr(
+        "app.api.user.services.username_candidates",
+        lambda name, count, digits=2: (taken + ["ada13", "ada14"])[:count],
+    )
+
+    async def run():
+        async with sqlite_session() as (session, _):
+            service = UserService(session=session)
+            for i, username in enumerate(taken):
+                await service.create_user(
+                    new_user(username=username, email=f"ada{i}@example.com")
+                )
+            # an index that has not seen them, as if another worker took them
+            username_index.filter = BloomFilter(capacity=100, error_rate=0.01)
+            suggestions = await service.suggest_usernames("Ada", 2)
+            created = await service.create_user(
+                new_user(username=None, email="new@example.com")
+            )
+            return suggestions, created["username"]
+
+    suggestions, generated = asyncio.run(run())
+
+    assert suggestions == ["ada13", "ada14"]
+    assert generated == "ada13"
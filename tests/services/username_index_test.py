@@ -0,0 +1,14 @@
+from app.api.user.username_index import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=5_000, error_rate=0.01)
+    taken = [f"user{i}" for i in range(5_000)]
+    for username in taken:
+        bloom.add(username)
+
+    assert all(username in bloom for username in taken)
+
+    false_positives = sum(f"free{i}" in bloom for i in range(10_000))
+    assert false_positives / 10_000 < 0.02
+    assert bloom.estimated_error_rate() < 0.02